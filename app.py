@@ -4,7 +4,7 @@ import time
 import secrets
 import datetime
 import os
-import psycopg2
+import psycopg
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, ReplyKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -19,6 +19,25 @@ from telegram.ext import (
 from dotenv import load_dotenv
 load_dotenv()
 
+import db
+import migrations
+from broadcast import broadcaster, delivery_tracker
+from catalog import catalog
+from exports import EXPORT_MAX_BYTES, EXPORT_TABLES, export_table
+from interaction_log import interaction_writer
+from interaction_retention import interaction_retention
+from job_store import job_store
+from listings import LISTINGS
+from membership import membership
+from reminders import REMINDER_HOUR, REMINDER_TIMEZONE, reminder_dispatcher
+from repositories import profile_cache, user_repo, task_repo, payment_repo, coach_repo, stats_repo, ledger_repo
+from router import CallbackRouter
+from state_store import state_store
+from task_import import TASK_EXPIRY_HOURS, parse_expiry_hours, parse_task, parse_task_ids, parse_tasks
+from templates import HELP_TOPICS, templates
+from update_processor import update_processor
+from webhook import run_webhook
+
 # Bot credentials
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7603606508:AAHACwLH7BtDb5UUz-ifwTxeSWBZGlCwGOw")
 ADMIN_ID = int(os.getenv("ADMIN_ID", 5646269450))  # Super admin ID
@@ -27,162 +46,19 @@ SITE_LINK = os.getenv("SITE_LINK", "https://etherealweb.site/signup?ref=Bigscott
 AI_BOOST_LINK = os.getenv("AI_BOOST_LINK", "https://etherealweb.site/account/social-boost")
 VERIFICATION_GROUP = os.getenv("VERIFICATION_GROUP", "@taskchecked")
 DAILY_TASK_LINK = os.getenv("DAILY_TASK_LINK", "https://etherealweb.site/account/social/snapchat-streak")
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook"
 DATABASE_URL = os.getenv("DATABASE_URL")
-
-# Predefined FAQs
-FAQS = {
-    "what_is_ethereal": {
-        "question": "What is Ethereal?",
-        "answer": "Ethereal is a platform where you earn money by completing tasks like reading posts, playing games, sending Snapchat streaks, and inviting friends."
-    },
-    "payment_methods": {
-        "question": "What payment methods are available?",
-        "answer": "Payments can be made via bank transfer, mobile money, or Zelle, depending on your country. Check the 'How to Pay' guide in the Help menu."
-    },
-    "task_rewards": {
-        "question": "How are task rewards calculated?",
-        "answer": "Rewards vary by task type. For example, reading posts earns $2.5 per 10 words, Candy Crush tasks earn $5 daily, and Snapchat streaks can earn up to $20."
-    }
-}
-
-HELP_TOPICS = {
-    "how_to_pay": {"label": "How to Pay", "type": "video", "url": "https://youtu.be/YourPaymentGuide"},
-    "register": {"label": "Registration Process", "type": "text", "text": (
-        "1. Once you have clicked start → choose package\n"
-        "2. Select your coach\n"
-        "3. Pay via your selected country account → upload screenshot\n"
-        "4. Wait for approval, then send details\n"
-        "5. Join the group and start earning! 🎉"
-    )},
-    "daily_tasks": {"label": "Daily Tasks", "type": "video", "url": "https://youtu.be/YourTasksGuide"},
-    "reminder": {"label": "Toggle Reminder", "type": "toggle"},
-    "faq": {"label": "FAQs", "type": "faq"},
-    "password_recovery": {"label": "Password Recovery", "type": "input", "text": "Please provide your registered email to request password recovery:"},
-    "apply_coach": {"label": "Apply to be a Coach", "type": "text", "text": "To apply to be a coach, use the /coach command. An admin will contact you."},
-}
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+PAYMENT_FOLLOW_UP_DELAY = int(os.getenv("PAYMENT_FOLLOW_UP_DELAY", 3600))  # seconds before a pending payment gets a reminder
 
 # Database setup with PostgreSQL
-try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
-
-    # Users table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        chat_id BIGINT PRIMARY KEY,
-        package TEXT,
-        payment_status TEXT DEFAULT 'new',
-        name TEXT,
-        username TEXT,
-        email TEXT,
-        phone TEXT,
-        password TEXT,
-        join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        alarm_setting INTEGER DEFAULT 0,
-        streaks INTEGER DEFAULT 0,
-        invites INTEGER DEFAULT 0,
-        balance REAL DEFAULT 0,
-        screenshot_uploaded_at TIMESTAMP,
-        approved_at TIMESTAMP,
-        registration_date TIMESTAMP,
-        referral_code TEXT,
-        referred_by BIGINT,
-        selected_coach BIGINT
-    )
-    """)
-
-    # Payments table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS payments (
-        id SERIAL PRIMARY KEY,
-        chat_id BIGINT,
-        type TEXT,
-        package TEXT,
-        quantity INTEGER,
-        total_amount INTEGER,
-        payment_account TEXT,
-        status TEXT DEFAULT 'pending_payment',
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        approved_at TIMESTAMP
-    )
-    """)
-
-    # Coupons table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS coupons (
-        id SERIAL PRIMARY KEY,
-        payment_id INTEGER,
-        code TEXT,
-        FOREIGN KEY (payment_id) REFERENCES payments(id)
-    )
-    """)
-
-    # Interactions table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS interactions (
-        id SERIAL PRIMARY KEY,
-        chat_id BIGINT,
-        action TEXT,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Tasks table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS tasks (
-        id SERIAL PRIMARY KEY,
-        type TEXT,
-        link TEXT,
-        reward REAL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        expires_at TIMESTAMP
-    )
-    """)
-
-    # User_tasks table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS user_tasks (
-        user_id BIGINT,
-        task_id INTEGER,
-        completed_at TIMESTAMP,
-        PRIMARY KEY (user_id, task_id),
-        FOREIGN KEY (user_id) REFERENCES users(chat_id),
-        FOREIGN KEY (task_id) REFERENCES tasks(id)
-    )
-    """)
-
-    # Coaches table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS coaches (
-        coach_id BIGINT PRIMARY KEY,
-        name TEXT,
-        added_by BIGINT,
-        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Payment accounts table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS payment_accounts (
-        id SERIAL PRIMARY KEY,
-        country TEXT,
-        flag TEXT,
-        details TEXT,
-        is_active INTEGER DEFAULT 1
-    )
-    """)
-
-    # Add default coach if not exists
-    cursor.execute("SELECT * FROM coaches WHERE coach_id=%s", (ADMIN_ID,))
-    if not cursor.fetchone():
-        cursor.execute("INSERT INTO coaches (coach_id, name, added_by) VALUES (%s, %s, %s)", (ADMIN_ID, "Big Scott Media", ADMIN_ID))
-    conn.commit()
-except psycopg2.Error as e:
-    logging.error(f"Database error: {e}")
-    raise
-
-# In-memory storage
-user_state = {}
+async def init_schema():
+    await migrations.migrate()
+    # Default coach
+    await coach_repo.add(ADMIN_ID, "Big Scott Media", ADMIN_ID)
+
 start_time = time.time()
 
 # Logging
@@ -190,21 +66,15 @@ logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s
 logger = logging.getLogger(__name__)
 
 # Helper functions
-def get_status(chat_id):
+async def get_status(chat_id, fresh=False):
     try:
-        cursor.execute("SELECT payment_status FROM users WHERE chat_id=%s", (chat_id,))
-        row = cursor.fetchone()
-        return row[0] if row else None
-    except psycopg2.Error as e:
+        return await user_repo.get_status(chat_id, fresh=fresh)
+    except psycopg.Error as e:
         logger.error(f"Database error in get_status: {e}")
         return None
 
-def log_interaction(chat_id, action):
-    try:
-        cursor.execute("INSERT INTO interactions (chat_id, action) VALUES (%s, %s)", (chat_id, action))
-        conn.commit()
-    except psycopg2.Error as e:
-        logger.error(f"Database error in log_interaction: {e}")
+async def log_interaction(chat_id, action):
+    await interaction_writer.log(chat_id, action)
 
 def generate_referral_code():
     return secrets.token_urlsafe(6)
@@ -217,19 +87,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     referred_by = None
     if args and args[0].startswith("ref_"):
         referred_by = int(args[0].split("_")[1])
-    log_interaction(chat_id, "start")
+    await log_interaction(chat_id, "start")
     try:
-        cursor.execute("SELECT payment_status FROM users WHERE chat_id=%s", (chat_id,))
-        if not cursor.fetchone():
-            cursor.execute(
-                "INSERT INTO users (chat_id, username, referral_code, referred_by) VALUES (%s, %s, %s, %s)",
-                (chat_id, update.effective_user.username or "Unknown", referral_code, referred_by)
-            )
-            conn.commit()
-            if referred_by:
-                cursor.execute("UPDATE users SET invites = invites + 1, balance = balance + 0.1 WHERE chat_id=%s", (referred_by,))
-                conn.commit()
-    except psycopg2.Error as e:
+        if not await user_repo.create(chat_id, update.effective_user.username or "Unknown", referral_code, referred_by):
+            # A returning user can be messaged again, so put them back on the fan-out lists
+            await delivery_tracker.mark_reachable(chat_id)
+    except psycopg.Error as e:
         logger.error(f"Database error in start: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
         return
@@ -249,34 +112,58 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=ReplyKeyboardMarkup(reply_keyboard, resize_keyboard=True)
     )
 
+async def timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    try:
+        if not context.args:
+            current = await user_repo.get_timezone(chat_id)
+            await update.message.reply_text(
+                f"Your reminder timezone is {current or REMINDER_TIMEZONE}.\n"
+                "To change it, send /timezone <Region/City>, e.g. /timezone Africa/Lagos"
+            )
+            return
+        # Checked against PostgreSQL's list, since that is what the reminder queries resolve names with
+        name = await reminder_dispatcher.known_timezone(context.args[0])
+        if not name:
+            await update.message.reply_text(
+                f"Unknown timezone: {context.args[0]}. Use a name like Africa/Lagos or Europe/London."
+            )
+            return
+        if not await user_repo.set_timezone(chat_id, name):
+            await update.message.reply_text("Please use /start first.")
+            return
+        await update.message.reply_text(f"Daily reminders will now arrive around {REMINDER_HOUR:02d}:00 {name} time.")
+        await log_interaction(chat_id, "timezone")
+    except psycopg.Error as e:
+        logger.error(f"Database error in timezone: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
 async def support(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    user_state[chat_id] = {'expecting': 'support_message'}
+    await state_store.set(chat_id, {'expecting': 'support_message'})
     await update.message.reply_text("Please describe your issue or question:")
-    log_interaction(chat_id, "support_initiated")
+    await log_interaction(chat_id, "support_initiated")
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    log_interaction(chat_id, "stats")
+    await log_interaction(chat_id, "stats")
     try:
-        cursor.execute("SELECT payment_status, streaks, invites, package, balance FROM users WHERE chat_id=%s", (chat_id,))
-        user = cursor.fetchone()
+        user = await user_repo.get_profile(chat_id)
         if not user:
             if update.callback_query:
                 await update.callback_query.answer("No user data found. Please start with /start.")
             else:
                 await update.message.reply_text("No user data found. Please start with /start.")
             return
-        payment_status, streaks, invites, package, balance = user
         text = (
             "📊 Your Platform Stats:\n\n"
-            f"• Package: {package or 'Not selected'}\n"
-            f"• Payment Status: {payment_status.capitalize()}\n"
-            f"• Streaks: {streaks}\n"
-            f"• Invites: {invites}\n"
-            f"• Balance: ${balance:.2f}"
+            f"• Package: {user.package or 'Not selected'}\n"
+            f"• Payment Status: {user.payment_status.capitalize()}\n"
+            f"• Streaks: {user.streaks}\n"
+            f"• Invites: {user.invites}\n"
+            f"• Balance: ${user.balance:.2f}"
         )
-        if balance >= 30:
+        if user.balance >= 30:
             keyboard = [[InlineKeyboardButton("💸 Withdraw", callback_data="withdraw")]]
         else:
             keyboard = []
@@ -284,25 +171,24 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
         else:
             await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         logger.error(f"Database error in stats: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
 async def reset_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    if chat_id in user_state:
-        del user_state[chat_id]
+    await state_store.delete(chat_id)
     await update.message.reply_text("State reset. Try the flow again.")
-    log_interaction(chat_id, "reset_state")
+    await log_interaction(chat_id, "reset_state")
 
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     if chat_id != ADMIN_ID:
         await update.message.reply_text("This command is restricted to the super admin.")
         return
-    user_state[chat_id] = {'expecting': 'broadcast_message'}
+    await state_store.set(chat_id, {'expecting': 'broadcast_message'})
     await update.message.reply_text("Please enter the broadcast message to send to all registered users:")
-    log_interaction(chat_id, "broadcast_initiated")
+    await log_interaction(chat_id, "broadcast_initiated")
 
 async def botstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
@@ -311,16 +197,20 @@ async def botstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     runtime = time.time() - start_time
     try:
-        cursor.execute("SELECT COUNT(DISTINCT chat_id) FROM users")
-        total_users = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(DISTINCT chat_id) FROM users WHERE payment_status='registered'")
-        registered_users = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM interactions WHERE action='start'")
-        link_clicks = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM interactions WHERE timestamp >= NOW() - INTERVAL '1 hour'")
-        hourly_usage = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM interactions WHERE timestamp >= NOW() - INTERVAL '24 hours'")
-        daily_usage = cursor.fetchone()[0]
+        counters = await stats_repo.counters()
+        total_users = counters.get('users_total', 0)
+        registered_users = counters.get('users_registered', 0)
+        link_clicks = counters.get('start_clicks', 0)
+        now = datetime.datetime.now()
+        hourly_usage = await stats_repo.interactions_since(now - datetime.timedelta(hours=1))
+        daily_usage = await stats_repo.interactions_since(now - datetime.timedelta(hours=24))
+        cache_stats = profile_cache.stats()
+        log_stats = interaction_writer.stats()
+        update_stats = update_processor.stats()
+        member_stats = membership.stats()
+        job_stats = job_store.stats()
+        pending_jobs = await job_store.pending()
+        delivery_stats = delivery_tracker.stats()
         text = (
             "🤖 Bot Stats:\n\n"
             f"• Runtime: {int(runtime // 3600)}h {int((runtime % 3600) // 60)}m\n"
@@ -328,31 +218,89 @@ async def botstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"• Registered Users: {registered_users}\n"
             f"• Bot Link Clicks: {link_clicks}\n"
             f"• Hourly Interactions: {hourly_usage}\n"
-            f"• Daily Interactions: {daily_usage}"
+            f"• Daily Interactions: {daily_usage}\n"
+            f"• Profile Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%}), {cache_stats['size']} cached\n"
+            f"• Interaction Log: {log_stats['written']} written, {log_stats['queued']} queued, {log_stats['dropped']} dropped\n"
+            f"• Updates: {update_stats['in_flight']} in flight (peak {update_stats['max_in_flight']}), {update_stats['processed']} processed\n"
+            f"• Membership Checks: {member_stats['api_calls']} API calls, {member_stats['coalesced']} coalesced, "
+            f"{member_stats['members']['hits'] + member_stats['non_members']['hits']} served from cache\n"
+            f"• Scheduled Jobs: {pending_jobs} pending, {job_stats['fired']} fired, {job_stats['failed']} failed\n"
+            f"• Unreachable Users: {delivery_stats['marked']} marked, {delivery_stats['restored']} restored by /start"
         )
         await update.message.reply_text(text)
-        log_interaction(chat_id, "botstats")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "botstats")
+    except psycopg.Error as e:
         logger.error(f"Database error in botstats: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
-async def registered_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     if chat_id != ADMIN_ID:
         await update.message.reply_text("This command is restricted to the super admin.")
         return
     try:
-        cursor.execute("SELECT chat_id, username, package, registration_date FROM users WHERE payment_status='registered'")
-        users = cursor.fetchall()
-        if not users:
-            await update.message.reply_text("No registered users found.")
+        broadcasts = await broadcaster.recent()
+        if not broadcasts:
+            await update.message.reply_text("No broadcasts yet.")
             return
-        text = "Registered Users:\n\n"
-        for user in users:
-            text += f"Chat ID: {user[0]}, Username: @{user[1] or 'Unknown'}, Package: {user[2]}, Registered: {user[3]}\n"
+        text = "📢 Recent Broadcasts:\n\n"
+        for broadcast_id, audience, status, sent, failed, blocked, created_at in broadcasts:
+            text += f"#{broadcast_id} ({audience}, {status}) sent: {sent}, failed: {failed}, blocked: {blocked}, started: {created_at:%Y-%m-%d %H:%M}\n"
         await update.message.reply_text(text)
-        log_interaction(chat_id, "registered_users")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "broadcast_status")
+    except psycopg.Error as e:
+        logger.error(f"Database error in broadcast_status: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def reminder_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    try:
+        runs = await reminder_dispatcher.recent()
+        if not runs:
+            await update.message.reply_text("No reminder runs yet.")
+            return
+        lines = ["⏰ Recent Reminder Runs:\n"]
+        for run_id, slot, status, shards_done, shards, sent, failed, blocked, failed_shards, last_error, _, _ in runs:
+            lines.append(
+                f"#{run_id} {slot:%Y-%m-%d %H:%M} UTC ({status}, {shards_done}/{shards} shards) "
+                f"sent: {sent}, failed: {failed}, blocked: {blocked}"
+            )
+            if failed_shards:
+                lines.append(f"   ⚠️ {failed_shards} shard(s) hit a database error: {last_error}")
+        await update.message.reply_text("\n".join(lines))
+        await log_interaction(chat_id, "reminder_stats")
+    except psycopg.Error as e:
+        logger.error(f"Database error in reminder_stats: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def route_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    routes = callback_router.report()
+    if not routes:
+        await update.message.reply_text("No callback queries handled yet.")
+        return
+    text = "⏱ Callback Routes (by total time):\n\n"
+    for route, route_stat in routes:
+        text += f"{route}: {route_stat.calls} calls, avg {route_stat.avg_time * 1000:.1f}ms, max {route_stat.max_time * 1000:.1f}ms, errors {route_stat.errors}\n"
+    await update.message.reply_text(text)
+    await log_interaction(chat_id, "route_stats")
+
+async def registered_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    try:
+        text, reply_markup = await LISTINGS["registered"].page()
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        await log_interaction(chat_id, "registered_users")
+    except psycopg.Error as e:
         logger.error(f"Database error in registered_users: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -362,34 +310,171 @@ async def add_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("This command is restricted to the super admin.")
         return
     args = context.args
-    if len(args) != 3:
-        await update.message.reply_text("Usage: /add_task <type> <link> <reward>")
+    if len(args) not in (3, 4):
+        await update.message.reply_text("Usage: /add_task <type> <link> <reward> [expiry_hours]")
         return
-    task_type, link, reward = args
+    created_at = datetime.datetime.now()
+    # Same checks as a bulk import, so nan, inf and non-positive values are refused here too
     try:
-        reward = float(reward)
-    except ValueError:
-        await update.message.reply_text("Reward must be a number.")
+        task = parse_task(args, now=created_at)
+    except ValueError as e:
+        await update.message.reply_text(f"Invalid task: {e}")
         return
-    created_at = datetime.datetime.now()
-    expires_at = created_at + datetime.timedelta(days=1)
     try:
-        cursor.execute(
-            "INSERT INTO tasks (type, link, reward, created_at, expires_at) VALUES (%s, %s, %s, %s, %s)",
-            (task_type, link, reward, created_at, expires_at)
-        )
-        conn.commit()
+        await task_repo.create(task.type, task.link, task.reward, created_at, task.expires_at)
         await update.message.reply_text("Task added successfully.")
-        log_interaction(chat_id, "add_task")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "add_task")
+    except psycopg.Error as e:
         logger.error(f"Database error in add_task: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
+# Parses and inserts a bulk task upload; nothing is imported if any line is invalid
+async def import_tasks_from(update: Update, content, fmt, expiry_hours):
+    tasks, errors = parse_tasks(content, fmt, expiry_hours=expiry_hours)
+    if errors:
+        shown = "\n".join(errors[:10])
+        more = f"\n...and {len(errors) - 10} more" if len(errors) > 10 else ""
+        await update.message.reply_text(f"Import rejected, nothing was added:\n{shown}{more}")
+        return
+    if not tasks:
+        await update.message.reply_text("No tasks found in the upload.")
+        return
+    try:
+        task_ids = await task_repo.create_many(tasks)
+        await update.message.reply_text(f"Imported {len(task_ids)} tasks (#{task_ids[0]}–#{task_ids[-1]}).")
+        await log_interaction(update.effective_chat.id, "import_tasks")
+    except psycopg.Error as e:
+        logger.error(f"Database error in import_tasks: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def import_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    first_line, _, body = update.message.text.partition("\n")
+    args = first_line.split()[1:]
+    try:
+        expiry_hours = parse_expiry_hours(args[0]) if args else TASK_EXPIRY_HOURS
+    except ValueError:
+        await update.message.reply_text("Usage: /import_tasks [expiry_hours], followed by one '<type> <link> <reward> [expiry_hours]' per line")
+        return
+    if body.strip():
+        await import_tasks_from(update, body, "lines", expiry_hours)
+        return
+    await state_store.set(chat_id, {'expecting': 'task_import', 'expiry_hours': expiry_hours})
+    await update.message.reply_text(
+        "Send the tasks as a CSV or JSON file, or as a message with one '<type> <link> <reward> [expiry_hours]' per line.\n"
+        "CSV/JSON fields: type, link, reward, and optionally expires_in_hours or expires_at."
+    )
+
+async def expire_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    if not context.args:
+        await update.message.reply_text("Usage: /expire_tasks <ids, e.g. 3 7 10-20> or /expire_tasks all")
+        return
+    try:
+        task_ids = None if context.args == ["all"] else parse_task_ids(context.args)
+        expired = await task_repo.expire(task_ids)
+        await update.message.reply_text(f"Expired {len(expired)} tasks.")
+        await log_interaction(chat_id, "expire_tasks")
+    except ValueError:
+        await update.message.reply_text("Invalid task ids.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in expire_tasks: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def delete_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    if not context.args:
+        await update.message.reply_text("Usage: /delete_tasks <ids, e.g. 3 7 10-20>")
+        return
+    try:
+        task_ids = parse_task_ids(context.args)
+        deleted = set(await task_repo.delete_many(task_ids))
+        text = f"Deleted {len(deleted)} tasks."
+        kept = [task_id for task_id in task_ids if task_id not in deleted]
+        if kept:
+            text += f"\n{len(kept)} were not deleted (unknown, or already completed by users; use /expire_tasks for those)."
+        await update.message.reply_text(text)
+        await log_interaction(chat_id, "delete_tasks")
+    except ValueError:
+        await update.message.reply_text("Invalid task ids.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in delete_tasks: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    args = context.args
+    if not args or args[0] not in EXPORT_TABLES or len(args) > 3:
+        await update.message.reply_text(
+            f"Usage: /export <{'|'.join(EXPORT_TABLES)}> [from YYYY-MM-DD] [to YYYY-MM-DD]"
+        )
+        return
+    try:
+        since = datetime.date.fromisoformat(args[1]) if len(args) > 1 else None
+        until = datetime.date.fromisoformat(args[2]) if len(args) > 2 else None
+    except ValueError:
+        await update.message.reply_text("Dates must be in YYYY-MM-DD format.")
+        return
+    try:
+        result = await export_table(args[0], since, until)
+        with result.file:
+            if result.size > EXPORT_MAX_BYTES:
+                await update.message.reply_text(
+                    f"The export is {result.size / 1024 / 1024:.1f} MB, over the upload limit. Please narrow the date range."
+                )
+                return
+            await update.message.reply_document(
+                document=result.file,
+                filename=result.filename,
+                caption=f"{args[0]}: {result.rows} rows",
+            )
+        await log_interaction(chat_id, "export")
+    except psycopg.Error as e:
+        logger.error(f"Database error in export: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
+async def summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if chat_id != ADMIN_ID:
+        await update.message.reply_text("This command is restricted to the super admin.")
+        return
+    if len(context.args) > 2:
+        await update.message.reply_text("Usage: /summary [date YYYY-MM-DD] [to YYYY-MM-DD]")
+        return
+    try:
+        first_day = datetime.date.fromisoformat(context.args[0]) if context.args else datetime.date.today()
+        last_day = datetime.date.fromisoformat(context.args[1]) if len(context.args) > 1 else first_day
+    except ValueError:
+        await update.message.reply_text("Dates must be in YYYY-MM-DD format.")
+        return
+    if last_day < first_day:
+        await update.message.reply_text("The end date must not be before the start date.")
+        return
+    try:
+        result = await stats_repo.daily_summary(first_day, last_day)
+        label = first_day.isoformat() if first_day == last_day else f"{first_day.isoformat()} to {last_day.isoformat()}"
+        await update.message.reply_text(format_daily_summary(label, result))
+        await log_interaction(chat_id, "summary")
+    except psycopg.Error as e:
+        logger.error(f"Database error in summary: {e}")
+        await update.message.reply_text("An error occurred. Please try again.")
+
 async def apply_coach(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     try:
-        cursor.execute("SELECT payment_status FROM users WHERE chat_id=%s", (chat_id,))
-        status = cursor.fetchone()[0]
+        status = await get_status(chat_id)
         if status != 'registered':
             await update.message.reply_text("Only registered users can apply to be a coach.")
             return
@@ -398,8 +483,8 @@ async def apply_coach(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"User @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id}) wants to apply to be a coach."
         )
         await update.message.reply_text("Your application has been sent. An admin will contact you soon.")
-        log_interaction(chat_id, "apply_coach")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "apply_coach")
+    except psycopg.Error as e:
         logger.error(f"Database error in apply_coach: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -413,18 +498,16 @@ async def add_coach(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         coach_id = int(context.args[0])
-        cursor.execute("SELECT * FROM coaches WHERE coach_id=%s", (coach_id,))
-        if cursor.fetchone():
+        coach_name = f"Coach {coach_id}" if coach_id != ADMIN_ID else "Big Scott Media"
+        if not await coach_repo.add(coach_id, coach_name, ADMIN_ID):
             await update.message.reply_text("This user is already a coach.")
             return
-        coach_name = f"Coach {coach_id}" if coach_id != ADMIN_ID else "Big Scott Media"
-        cursor.execute("INSERT INTO coaches (coach_id, name, added_by) VALUES (%s, %s, %s)", (coach_id, coach_name, ADMIN_ID))
-        conn.commit()
+        catalog.invalidate()
         await update.message.reply_text(f"Coach {coach_id} added successfully as {coach_name}.")
-        log_interaction(chat_id, "add_coach")
+        await log_interaction(chat_id, "add_coach")
     except ValueError:
         await update.message.reply_text("Invalid chat_id.")
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         logger.error(f"Database error in add_coach: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -434,17 +517,10 @@ async def list_coaches(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("This command is restricted to the super admin.")
         return
     try:
-        cursor.execute("SELECT coach_id, name FROM coaches")
-        coaches = cursor.fetchall()
-        if not coaches:
-            await update.message.reply_text("No coaches found.")
-            return
-        text = "List of Coaches:\n\n"
-        for coach in coaches:
-            text += f"Coach ID: {coach[0]}, Name: {coach[1]}\n"
-        await update.message.reply_text(text)
-        log_interaction(chat_id, "list_coaches")
-    except psycopg2.Error as e:
+        text, reply_markup = await LISTINGS["coaches"].page()
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        await log_interaction(chat_id, "list_coaches")
+    except psycopg.Error as e:
         logger.error(f"Database error in list_coaches: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -458,16 +534,15 @@ async def remove_coach(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         coach_id = int(context.args[0])
-        cursor.execute("DELETE FROM coaches WHERE coach_id=%s", (coach_id,))
-        if cursor.rowcount == 0:
+        if not await coach_repo.remove(coach_id):
             await update.message.reply_text("Coach not found.")
         else:
-            conn.commit()
+            catalog.invalidate()
             await update.message.reply_text(f"Coach {coach_id} removed successfully.")
-        log_interaction(chat_id, "remove_coach")
+        await log_interaction(chat_id, "remove_coach")
     except ValueError:
         await update.message.reply_text("Invalid coach_id.")
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         logger.error(f"Database error in remove_coach: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -477,48 +552,37 @@ async def registration_stats(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("This command is restricted to the super admin.")
         return
     try:
-        cursor.execute("SELECT COUNT(*) FROM users WHERE payment_status='registered'")
-        total_registered = cursor.fetchone()[0]
-        cursor.execute("SELECT package, COUNT(*) FROM users WHERE payment_status='registered' GROUP BY package")
-        package_counts = cursor.fetchall()
-        cursor.execute("SELECT selected_coach, COUNT(*) FROM users WHERE payment_status='registered' GROUP BY selected_coach")
-        coach_counts = cursor.fetchall()
-        text = f"📊 Registration Statistics:\n\nTotal Registered Users: {total_registered}\n\n"
+        counters = await stats_repo.counters()
+        coach_names = {coach.coach_id: coach.name for coach in await catalog.coaches()}
+        text = f"📊 Registration Statistics:\n\nTotal Registered Users: {counters.get('users_registered', 0)}\n\n"
         text += "Registrations per Package:\n"
-        for package, count in package_counts:
-            text += f"- {package}: {count}\n"
+        for name, count in sorted(counters.items()):
+            if name.startswith("registered_package:") and count:
+                text += f"- {name.split(':', 1)[1] or None}: {count}\n"
         text += "\nRegistrations per Coach:\n"
-        for coach_id, count in coach_counts:
-            if coach_id:
-                cursor.execute("SELECT name FROM coaches WHERE coach_id=%s", (coach_id,))
-                coach_name = cursor.fetchone()[0]
-                text += f"- {coach_name}: {count}\n"
-            else:
-                text += f"- No coach: {count}\n"
+        for name, count in sorted(counters.items()):
+            if name.startswith("registered_coach:") and count:
+                coach_id = name.split(':', 1)[1]
+                if coach_id:
+                    text += f"- {coach_names.get(int(coach_id), coach_id)}: {count}\n"
+                else:
+                    text += f"- No coach: {count}\n"
         await update.message.reply_text(text)
-        log_interaction(chat_id, "registration_stats")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "registration_stats")
+    except psycopg.Error as e:
         logger.error(f"Database error in registration_stats: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
 async def my_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    cursor.execute("SELECT * FROM coaches WHERE coach_id=%s", (chat_id,))
-    if not cursor.fetchone():
-        await update.message.reply_text("You are not a coach.")
-        return
     try:
-        cursor.execute("SELECT chat_id, username, package, registration_date FROM users WHERE selected_coach=%s AND payment_status='registered'", (chat_id,))
-        users = cursor.fetchall()
-        if not users:
-            await update.message.reply_text("You have no registered users.")
+        if not await catalog.coach(chat_id):
+            await update.message.reply_text("You are not a coach.")
             return
-        text = "Your Registered Users:\n\n"
-        for user in users:
-            text += f"Chat ID: {user[0]}, Username: @{user[1] or 'Unknown'}, Package: {user[2]}, Registered: {user[3]}\n"
-        await update.message.reply_text(text)
-        log_interaction(chat_id, "my_users")
-    except psycopg2.Error as e:
+        text, reply_markup = await LISTINGS["myusers"].page(scope=chat_id)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        await log_interaction(chat_id, "my_users")
+    except psycopg.Error as e:
         logger.error(f"Database error in my_users: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -534,11 +598,11 @@ async def add_account(update: Update, context: ContextTypes.DEFAULT_TYPE):
     flag = context.args[1]
     details = " ".join(context.args[2:])
     try:
-        cursor.execute("INSERT INTO payment_accounts (country, flag, details) VALUES (%s, %s, %s)", (country, flag, details))
-        conn.commit()
+        await payment_repo.add_account(country, flag, details)
+        catalog.invalidate()
         await update.message.reply_text(f"Payment account for {country} added successfully.")
-        log_interaction(chat_id, "add_account")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "add_account")
+    except psycopg.Error as e:
         logger.error(f"Database error in add_account: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -552,14 +616,13 @@ async def delete_account(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     country = context.args[0]
     try:
-        cursor.execute("DELETE FROM payment_accounts WHERE country=%s", (country,))
-        if cursor.rowcount == 0:
+        if not await payment_repo.delete_account(country):
             await update.message.reply_text("Account not found.")
         else:
-            conn.commit()
+            catalog.invalidate()
             await update.message.reply_text(f"Payment account for {country} deleted successfully.")
-        log_interaction(chat_id, "delete_account")
-    except psycopg2.Error as e:
+        await log_interaction(chat_id, "delete_account")
+    except psycopg.Error as e:
         logger.error(f"Database error in delete_account: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
@@ -569,543 +632,595 @@ async def list_accounts(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("This command is restricted to the super admin.")
         return
     try:
-        cursor.execute("SELECT country, flag, details, is_active FROM payment_accounts")
-        accounts = cursor.fetchall()
-        if not accounts:
-            await update.message.reply_text("No payment accounts found.")
-            return
-        text = "Payment Accounts:\n\n"
-        for account in accounts:
-            status = "Active" if account[3] else "Inactive"
-            text += f"Country: {account[0]} {account[1]}, Details: {account[2]}, Status: {status}\n"
-        await update.message.reply_text(text)
-        log_interaction(chat_id, "list_accounts")
-    except psycopg2.Error as e:
+        text, reply_markup = await LISTINGS["accounts"].page()
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        await log_interaction(chat_id, "list_accounts")
+    except psycopg.Error as e:
         logger.error(f"Database error in list_accounts: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
+# Returns (allowed, scope) for a listing; buttons are re-checked because callback data can be replayed
+async def listing_access(chat_id, name):
+    if name == "myusers":
+        return (True, chat_id) if await catalog.coach(chat_id) else (False, None)
+    return chat_id == ADMIN_ID, None
+
 # Callback handlers
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+callback_router = CallbackRouter()
+
+@callback_router.prefix("page_")
+async def cb_listing_page(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    name, direction, cursor = payload.split("_", 2)
+    allowed, scope = await listing_access(query.from_user.id, name)
+    if name not in LISTINGS or not allowed:
+        return
+    text, reply_markup = await LISTINGS[name].page(direction, int(cursor), scope=scope)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@callback_router.prefix("csv_")
+async def cb_listing_csv(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    chat_id = update.callback_query.from_user.id
+    allowed, scope = await listing_access(chat_id, payload)
+    if payload not in LISTINGS or not allowed:
+        return
+    result = await LISTINGS[payload].export_csv(scope=scope)
+    with result.file:
+        if result.size > EXPORT_MAX_BYTES:
+            await context.bot.send_message(chat_id, f"The export is {result.size / 1024 / 1024:.1f} MB, over the upload limit.")
+            return
+        await context.bot.send_document(
+            chat_id, document=result.file, filename=result.filename, caption=f"{LISTINGS[payload].title}: {result.rows} rows"
+        )
+
+@callback_router.exact("menu")
+async def cb_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    await state_store.delete(query.from_user.id)
+    await show_main_menu(update, context)
+
+@callback_router.exact("stats")
+async def cb_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    await stats(update, context)
+
+@callback_router.exact("refer_friend")
+async def cb_refer_friend(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
     query = update.callback_query
-    data = query.data
     chat_id = query.from_user.id
-    logger.info(f"Received callback data: {data} from chat_id: {chat_id}")
-    await query.answer()
-    log_interaction(chat_id, f"button_{data}")
+    referral_link = f"https://t.me/{context.bot.username}?start=ref_{chat_id}"
+    text = (
+        "👥 Refer a Friend and Earn Rewards!\n\n"
+        "Share your referral link with friends. For each friend who joins using your link, you earn $0.1. "
+        "If they register, you earn an additional $0.4 for Standard or $0.9 for X package.\n\n"
+        f"Your referral link: {referral_link}"
+    )
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
+
+@callback_router.exact("withdraw")
+async def cb_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    balance = (await user_repo.get_profile(chat_id)).balance
+    if balance < 30:
+        await query.answer("Your balance is less than $30.")
+        return
+    await context.bot.send_message(
+        ADMIN_ID,
+        f"Withdrawal request from @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id})\n"
+        f"Amount: ${balance}"
+    )
+    await query.edit_message_text(
+        "Your withdrawal request has been sent to the admin. Please wait for processing.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
+    )
+
+@callback_router.exact("how_it_works")
+async def cb_how_it_works(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    template = templates["how_it_works"]
+    await update.callback_query.edit_message_text(template.text, reply_markup=template.reply_markup)
 
+@callback_router.exact("coupon")
+async def cb_coupon(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    await state_store.set(chat_id, {'expecting': 'coupon_quantity'})
+    keyboard = [[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]
+    await query.edit_message_text("How many coupons do you want to purchase?", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@callback_router.exact("coupon_standard", "coupon_x")
+async def cb_coupon_standard(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    package = "Standard" if query.data == "coupon_standard" else "X"
+    price = 9000 if package == "Standard" else 14000
+    state = await state_store.get(chat_id)
+    quantity = state['coupon_quantity']
+    total = quantity * price
+    state.update({'coupon_package': package, 'coupon_total': total})
+    await state_store.set(chat_id, state)
+    await context.bot.send_message(
+        ADMIN_ID,
+        f"User @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id}) wants to purchase {quantity} {package} coupons for ₦{total}."
+    )
+    reply_markup = (await catalog.snapshot()).coupon_country_keyboard
+    if not reply_markup:
+        await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
+        return
+    await query.edit_message_text(
+        f"You are purchasing {quantity} {package} coupons.\nTotal amount: ₦{total}\n\nSelect the account to pay to:\n\nFor countries not listed, select 'Others' or contact @bigscottmedia",
+        reply_markup=reply_markup
+    )
+
+@callback_router.prefix("coupon_country_")
+async def cb_coupon_country(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    country = payload
+    account = await catalog.account(country)
+    if not account:
+        await context.bot.send_message(chat_id, "Error: Invalid country. Contact @bigscottmedia.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
+        return
+    payment_details = account.details
+    state = await state_store.get(chat_id)
+    state['selected_country'] = country
+    payment_id = await payment_repo.create_coupon_payment(
+        chat_id, state['coupon_package'], state['coupon_quantity'], state['coupon_total'], country
+    )
+    state['waiting_approval'] = {'type': 'coupon', 'payment_id': payment_id}
+    state['expecting'] = 'coupon_screenshot'
+    await state_store.set(chat_id, state)
+    keyboard = [
+        [InlineKeyboardButton("Change Country", callback_data="show_coupon_country_selection")],
+        [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
+    ]
+    await context.bot.send_message(
+        chat_id,
+        f"Payment details for {country}:\n\n{payment_details}\n\nPlease make the payment and send the screenshot.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@callback_router.exact("show_coupon_country_selection")
+async def cb_show_coupon_country_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    reply_markup = (await catalog.snapshot()).coupon_country_keyboard
+    if not reply_markup:
+        await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
+        return
+    state = await state_store.get(chat_id)
+    await query.edit_message_text(
+        f"You are purchasing {state['coupon_quantity']} {state['coupon_package']} coupons.\nTotal amount: ₦{state['coupon_total']}\n\nSelect the account to pay to:",
+        reply_markup=reply_markup
+    )
+
+@callback_router.exact("coupon_country_others")
+async def cb_coupon_country_others(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    state = await state_store.get(chat_id)
+    state['expecting'] = 'other_country_coupon'
+    await state_store.set(chat_id, state)
+    keyboard = [[InlineKeyboardButton("🔙 Country Selection", callback_data="show_coupon_country_selection")]]
+    await query.edit_message_text("Please enter your country:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@callback_router.exact("package_selector")
+async def cb_package_selector(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    status = await get_status(chat_id, fresh=True)
+    if status == 'registered':
+        await context.bot.send_message(chat_id, "You are already registered.")
+        return
+    keyboard = [
+        [InlineKeyboardButton("🚀X (₦14,000)", callback_data="reg_x")],
+        [InlineKeyboardButton("✈️Standard (₦9,000)", callback_data="reg_standard")],
+        [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")],
+    ]
+    await query.edit_message_text("Choose your package:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@callback_router.exact("reg_standard", "reg_x")
+async def cb_reg_standard(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    package = "Standard" if query.data == "reg_standard" else "X"
+    await state_store.set(chat_id, {'package': package})
     try:
-        if data == "menu":
-            if chat_id in user_state:
-                del user_state[chat_id]
-            await show_main_menu(update, context)
-        elif data == "stats":
-            await stats(update, context)
-        elif data == "refer_friend":
-            cursor.execute("SELECT referral_code FROM users WHERE chat_id=%s", (chat_id,))
-            referral_code = cursor.fetchone()[0]
-            referral_link = f"https://t.me/{context.bot.username}?start=ref_{chat_id}"
-            text = (
-                "👥 Refer a Friend and Earn Rewards!\n\n"
-                "Share your referral link with friends. For each friend who joins using your link, you earn $0.1. "
-                "If they register, you earn an additional $0.4 for Standard or $0.9 for X package.\n\n"
-                f"Your referral link: {referral_link}"
-            )
-            await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
-        elif data == "withdraw":
-            cursor.execute("SELECT balance FROM users WHERE chat_id=%s", (chat_id,))
-            balance = cursor.fetchone()[0]
-            if balance < 30:
-                await query.answer("Your balance is less than $30.")
-                return
-            await context.bot.send_message(
-                ADMIN_ID,
-                f"Withdrawal request from @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id})\n"
-                f"Amount: ${balance}"
-            )
+        await user_repo.select_package(chat_id, package, update.effective_user.username or "Unknown")
+        reply_markup = (await catalog.snapshot()).coach_keyboard
+        if not reply_markup:
+            await query.edit_message_text("No coaches available. Please contact @bigscottmedia.")
+            return
+        await query.edit_message_text("Select your coach:", reply_markup=reply_markup)
+    except psycopg.Error as e:
+        logger.error(f"Database error in package_selector: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+        return
+
+@callback_router.prefix("select_coach_")
+async def cb_select_coach(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    coach_id = int(payload)
+    state = await state_store.get(chat_id)
+    state['selected_coach'] = coach_id
+    await state_store.set(chat_id, state)
+    await user_repo.set_coach(chat_id, coach_id)
+    reply_markup = (await catalog.snapshot()).reg_country_keyboard
+    if not reply_markup:
+        await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
+        return
+    await query.edit_message_text("Select your country for payment:", reply_markup=reply_markup)
+
+@callback_router.prefix("reg_country_")
+async def cb_reg_country(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    country = payload
+    account = await catalog.account(country)
+    if not account:
+        await context.bot.send_message(chat_id, "Error: Invalid country. Contact @bigscottmedia.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
+        return
+    payment_details = account.details
+    state = await state_store.get(chat_id)
+    state['selected_country'] = country
+    state['expecting'] = 'reg_screenshot'
+    await state_store.set(chat_id, state)
+    keyboard = [
+        [InlineKeyboardButton("Change Country", callback_data="show_country_selection")],
+        [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
+    ]
+    await context.bot.send_message(
+        chat_id,
+        f"Payment details for {country}:\n\n{payment_details}\n\nPlease make the payment and send the screenshot.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@callback_router.exact("show_country_selection")
+async def cb_show_country_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    package = (await state_store.get(chat_id)).get('package', '')
+    if not package:
+        await query.edit_message_text("Please select a package first.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
+        return
+    reply_markup = (await catalog.snapshot()).reg_country_keyboard
+    if not reply_markup:
+        await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
+        return
+    await query.edit_message_text("Select your country for payment:", reply_markup=reply_markup)
+
+@callback_router.exact("reg_country_others")
+async def cb_reg_country_others(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    state = await state_store.get(chat_id)
+    state['expecting'] = 'other_country'
+    await state_store.set(chat_id, state)
+    keyboard = [[InlineKeyboardButton("🔙 Country Selection", callback_data="show_country_selection")]]
+    await query.edit_message_text("Please enter your country:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@callback_router.prefix("approve_reg_")
+async def cb_approve_reg(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    user_chat_id = int(payload)
+    try:
+        await user_repo.approve_payment(user_chat_id)
+        await context.bot.send_message(
+            user_chat_id,
+            "✅ Your payment is approved!\n\n*KINDLY 🎯 SEND YOUR DETAILS FOR YOUR REGISTRATION*\n"
+            "➡️ Email address\n➡️ Full name\n➡️ Username (e.g. @you)\n➡️ Phone number (with your country code)\n\n"
+            "All in one message, each on its own line as seen.",
+            parse_mode="Markdown"
+        )
+        await query.edit_message_text("Payment approved. Waiting for user details.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in approve_reg: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.prefix("approve_coupon_")
+async def cb_approve_coupon(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    payment_id = int(payload)
+    try:
+        await payment_repo.approve(payment_id)
+        await state_store.set(ADMIN_ID, {'expecting': {'type': 'coupon_codes', 'payment_id': payment_id}})
+        await context.bot.send_message(ADMIN_ID, f"Payment {payment_id} approved. Please send the coupon codes (one per line).")
+        await query.edit_message_text("Payment approved. Waiting for coupon codes.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in approve_coupon: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.prefix("approve_task_")
+async def cb_approve_task(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    task_id, user_chat_id = map(int, payload.split("_"))
+    try:
+        reward = await task_repo.complete(user_chat_id, task_id)
+        if reward is None:
+            await query.edit_message_text("This task was already approved for this user.")
+            return
+        await context.bot.send_message(user_chat_id, f"Task approved! You earned ${reward}.")
+        await query.edit_message_text("Task approved and reward awarded.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in approve_task: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.prefix("finalize_reg_")
+async def cb_finalize_reg(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    user_chat_id = int(payload)
+    await state_store.set(ADMIN_ID, {'expecting': 'user_credentials', 'for_user': user_chat_id})
+    await context.bot.send_message(
+        ADMIN_ID,
+        f"Please send the username and password for user {user_chat_id} in the format:\nusername\npassword"
+    )
+    await query.edit_message_text("Waiting for user credentials.")
+
+@callback_router.prefix("reject_task_")
+async def cb_reject_task(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    task_id, user_chat_id = map(int, payload.split("_"))
+    try:
+        if await task_repo.revoke(user_chat_id, task_id):
+            await context.bot.send_message(user_chat_id, "Task verification rejected. Reward revoked.")
+            await query.edit_message_text("Task rejected and reward removed.")
+        else:
+            await query.edit_message_text("Task rejected, but no reward was revoked (not credited, or balance insufficient).")
+    except psycopg.Error as e:
+        logger.error(f"Database error in reject_task: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.prefix("pending_reg_")
+async def cb_pending_reg(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    await context.bot.send_message(int(payload), "Your payment is still being reviewed. Please check back later.")
+
+@callback_router.prefix("pending_coupon_")
+async def cb_pending_coupon(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    payment_id = int(payload)
+    try:
+        user_chat_id = (await payment_repo.get(payment_id)).chat_id
+        await context.bot.send_message(user_chat_id, "Your coupon payment is still being reviewed.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in pending_coupon: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.exact("check_approval")
+async def cb_check_approval(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    state = await state_store.get(chat_id)
+    if 'waiting_approval' not in state:
+        await context.bot.send_message(chat_id, "You have no pending payments.")
+        return
+    approval = state['waiting_approval']
+    if approval['type'] == 'registration':
+        status = await get_status(chat_id, fresh=True)
+        if status == 'pending_details':
+            await context.bot.send_message(chat_id, "Payment approved. Please send your details.")
+        elif status == 'registered':
+            await context.bot.send_message(chat_id, "Your registration is complete.")
+        else:
+            await context.bot.send_message(chat_id, "Your payment is being reviewed.")
+    elif approval['type'] == 'coupon':
+        payment_id = approval['payment_id']
+        try:
+            status = (await payment_repo.get(payment_id)).status
+            if status == 'approved':
+                await context.bot.send_message(chat_id, "Coupon payment approved. Check your coupons above.")
+            else:
+                await context.bot.send_message(chat_id, "Your coupon payment is being reviewed.")
+        except psycopg.Error as e:
+            logger.error(f"Database error in check_approval: {e}")
+            await context.bot.send_message(chat_id, "An error occurred. Please try again.")
+
+@callback_router.exact("toggle_reminder")
+async def cb_toggle_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        new_setting = await user_repo.toggle_reminder(chat_id)
+        status = "enabled" if new_setting == 1 else "disabled"
+        await query.edit_message_text(f"Daily reminder {status}.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
+    except psycopg.Error as e:
+        logger.error(f"Database error in toggle_reminder: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.exact("boost_ai")
+async def cb_boost_ai(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    await query.edit_message_text(
+        f"🚀 Boost with AI\n\nAccess AI-powered features to maximize your earnings: {AI_BOOST_LINK}",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
+    )
+
+@callback_router.exact("user_registered")
+async def cb_user_registered(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        user = await user_repo.get_details(chat_id)
+        if user:
             await query.edit_message_text(
-                "Your withdrawal request has been sent to the admin. Please wait for processing.",
+                f"🎉 Registration Complete!\n\n"
+                f"• Site: {SITE_LINK}\n"
+                f"• Username: {user.username}\n"
+                f"• Email: {user.email}\n"
+                f"• Password: {user.password}\n\n"
+                "Keep your credentials safe. Use 'Password Recovery' in the Help menu if needed.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
             )
-        elif data == "how_it_works":
-            keyboard = [
-                [InlineKeyboardButton("💎Get Started", callback_data="package_selector")],
-                [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
-            ]
-            await query.edit_message_text(
-                "🔖 How Ethereal💚 Works\n"
-                "Ethereal rewards you for everyday activities — like reading posts, playing games (e.g., Candy Crush), "
-                "sending Snapchat streaks, and clicking links.\n"
-                "— — —\n"
-                "📍 ETHEREAL STANDARD — ₦9,000\n"
-                "• Instant ₦8,000 cashback\n"
-                "• Free up to 3GB data on signup\n"
-                "• Earn up to $1 per link\n"
-                "• Earn up to ₦2,500 for every 10 words read\n"
-                "• Up to ₦5,000 daily from Candy Crush\n"
-                "• Daily passive income from your team + your earnings (₦5,000 daily)\n"
-                "• Earn up to $20 sending Snapchat streaks\n"
-                "• ₦8,100–₦8,400 per person you invite\n"
-                "• Valid for 5 months (renewal fee required)\n"
-                "• No personal AI-assisted earnings\n\n"
-                "— — —\n\n"
-                "📍 ETHEREAL-X — ₦14,000\n"
-                "• Instant ₦12,000 cashback\n"
-                "• Free up to 5GB data on signup\n"
-                "• Earn up to $2 per link\n"
-                "• Earn up to ₦3,500 per 10 words (no cap)\n"
-                "• Up to ₦5,000 daily from Candy Crush\n"
-                "• Earn up to $50 sending Snapchat streaks\n"
-                "• Daily passive income from your team + your earnings (₦10,000 daily)\n"
-                "• ₦12,500–₦13,000 per person you invite\n"
-                "• Valid for 1 year (no renewal fee)\n"
-                "• Includes personal AI-assisted earnings",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "coupon":
-            user_state[chat_id] = {'expecting': 'coupon_quantity'}
-            keyboard = [[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]
-            await query.edit_message_text("How many coupons do you want to purchase?", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data in ["coupon_standard", "coupon_x"]:
-            package = "Standard" if data == "coupon_standard" else "X"
-            price = 9000 if package == "Standard" else 14000
-            quantity = user_state[chat_id]['coupon_quantity']
-            total = quantity * price
-            user_state[chat_id].update({'coupon_package': package, 'coupon_total': total})
-            await context.bot.send_message(
-                ADMIN_ID,
-                f"User @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id}) wants to purchase {quantity} {package} coupons for ₦{total}."
-            )
-            cursor.execute("SELECT country, flag FROM payment_accounts WHERE is_active=1")
-            accounts = cursor.fetchall()
-            if not accounts:
-                await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
-                return
-            keyboard = [[InlineKeyboardButton(f"{flag} {country}", callback_data=f"coupon_country_{country}")] for country, flag in accounts]
-            keyboard.append([InlineKeyboardButton("Others", callback_data="coupon_country_others")])
-            keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-            await query.edit_message_text(
-                f"You are purchasing {quantity} {package} coupons.\nTotal amount: ₦{total}\n\nSelect the account to pay to:\n\nFor countries not listed, select 'Others' or contact @bigscottmedia",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data.startswith("coupon_country_"):
-            country = data[len("coupon_country_"):]
-            cursor.execute("SELECT details FROM payment_accounts WHERE country=%s AND is_active=1", (country,))
-            result = cursor.fetchone()
-            if not result:
-                await context.bot.send_message(chat_id, "Error: Invalid country. Contact @bigscottmedia.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
-                return
-            payment_details = result[0]
-            user_state[chat_id]['selected_country'] = country
-            cursor.execute(
-                "INSERT INTO payments (chat_id, type, package, quantity, total_amount, payment_account, status) "
-                "VALUES (%s, 'coupon', %s, %s, %s, %s, 'pending_payment')",
-                (chat_id, user_state[chat_id]['coupon_package'], user_state[chat_id]['coupon_quantity'], user_state[chat_id]['coupon_total'], country)
-            )
-            conn.commit()
-            payment_id = cursor.lastval()
-            user_state[chat_id]['waiting_approval'] = {'type': 'coupon', 'payment_id': payment_id}
-            user_state[chat_id]['expecting'] = 'coupon_screenshot'
-            keyboard = [
-                [InlineKeyboardButton("Change Country", callback_data="show_coupon_country_selection")],
-                [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
-            ]
-            await context.bot.send_message(
-                chat_id,
-                f"Payment details for {country}:\n\n{payment_details}\n\nPlease make the payment and send the screenshot.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "show_coupon_country_selection":
-            cursor.execute("SELECT country, flag FROM payment_accounts WHERE is_active=1")
-            accounts = cursor.fetchall()
-            if not accounts:
-                await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
-                return
-            keyboard = [[InlineKeyboardButton(f"{flag} {country}", callback_data=f"coupon_country_{country}")] for country, flag in accounts]
-            keyboard.append([InlineKeyboardButton("Others", callback_data="coupon_country_others")])
-            keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-            await query.edit_message_text(
-                f"You are purchasing {user_state[chat_id]['coupon_quantity']} {user_state[chat_id]['coupon_package']} coupons.\nTotal amount: ₦{user_state[chat_id]['coupon_total']}\n\nSelect the account to pay to:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "coupon_country_others":
-            user_state[chat_id]['expecting'] = 'other_country_coupon'
-            keyboard = [[InlineKeyboardButton("🔙 Country Selection", callback_data="show_coupon_country_selection")]]
-            await query.edit_message_text("Please enter your country:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data == "package_selector":
-            status = get_status(chat_id)
-            if status == 'registered':
-                await context.bot.send_message(chat_id, "You are already registered.")
-                return
-            keyboard = [
-                [InlineKeyboardButton("🚀X (₦14,000)", callback_data="reg_x")],
-                [InlineKeyboardButton("✈️Standard (₦9,000)", callback_data="reg_standard")],
-                [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")],
-            ]
-            await query.edit_message_text("Choose your package:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data in ["reg_standard", "reg_x"]:
-            package = "Standard" if data == "reg_standard" else "X"
-            user_state[chat_id] = {'package': package}
-            try:
-                cursor.execute("UPDATE users SET package=%s, payment_status='pending_payment' WHERE chat_id=%s", (package, chat_id))
-                if cursor.rowcount == 0:
-                    cursor.execute("INSERT INTO users (chat_id, package, payment_status, username) VALUES (%s, %s, 'pending_payment', %s)", (chat_id, package, update.effective_user.username or "Unknown"))
-                conn.commit()
-                cursor.execute("SELECT coach_id, name FROM coaches")
-                coaches = cursor.fetchall()
-                if not coaches:
-                    await query.edit_message_text("No coaches available. Please contact @bigscottmedia.")
-                    return
-                keyboard = [[InlineKeyboardButton(f"{coach[1]}", callback_data=f"select_coach_{coach[0]}")] for coach in coaches]
-                keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-                await query.edit_message_text("Select your coach:", reply_markup=InlineKeyboardMarkup(keyboard))
-            except psycopg2.Error as e:
-                logger.error(f"Database error in package_selector: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-                return
-        elif data.startswith("select_coach_"):
-            coach_id = int(data[len("select_coach_"):])
-            user_state[chat_id]['selected_coach'] = coach_id
-            cursor.execute("UPDATE users SET selected_coach=%s WHERE chat_id=%s", (coach_id, chat_id))
-            conn.commit()
-            cursor.execute("SELECT country, flag FROM payment_accounts WHERE is_active=1")
-            accounts = cursor.fetchall()
-            if not accounts:
-                await query.edit_message_text("No active payment accounts available. Contact @bigscottmedia.")
-                return
-            keyboard = [[InlineKeyboardButton(f"{flag} {country}", callback_data=f"reg_country_{country}")] for country, flag in accounts]
-            keyboard.append([InlineKeyboardButton("Others", callback_data="reg_country_others")])
-            keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-            await query.edit_message_text("Select your country for payment:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data.startswith("reg_country_"):
-            country = data[len("reg_country_"):]
-            cursor.execute("SELECT details FROM payment_accounts WHERE country=%s AND is_active=1", (country,))
-            result = cursor.fetchone()
-            if not result:
-                await context.bot.send_message(chat_id, "Error: Invalid country. Contact @bigscottmedia.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
-                return
-            payment_details = result[0]
-            user_state[chat_id]['selected_country'] = country
-            user_state[chat_id]['expecting'] = 'reg_screenshot'
-            keyboard = [
-                [InlineKeyboardButton("Change Country", callback_data="show_country_selection")],
-                [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
-            ]
-            await context.bot.send_message(
-                chat_id,
-                f"Payment details for {country}:\n\n{payment_details}\n\nPlease make the payment and send the screenshot.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "show_country_selection":
-            package = user_state[chat_id].get('package', '')
-            if not package:
-                await query.edit_message_text("Please select a package first.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
-                return
-            cursor.execute("SELECT country, flag FROM payment_accounts WHERE is_active=1")
-            accounts = cursor.fetchall()
-            keyboard = [[InlineKeyboardButton(f"{flag} {country}", callback_data=f"reg_country_{country}")] for country, flag in accounts]
-            keyboard.append([InlineKeyboardButton("Others", callback_data="reg_country_others")])
-            keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-            await query.edit_message_text("Select your country for payment:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data == "reg_country_others":
-            user_state[chat_id]['expecting'] = 'other_country'
-            keyboard = [[InlineKeyboardButton("🔙 Country Selection", callback_data="show_country_selection")]]
-            await query.edit_message_text("Please enter your country:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data.startswith("approve_"):
-            parts = data.split("_")
-            if parts[1] == "reg":
-                user_chat_id = int(parts[2])
-                try:
-                    cursor.execute("UPDATE users SET payment_status='pending_details', approved_at=%s WHERE chat_id=%s", (datetime.datetime.now(), user_chat_id))
-                    conn.commit()
-                    await context.bot.send_message(
-                        user_chat_id,
-                        "✅ Your payment is approved!\n\n*KINDLY 🎯 SEND YOUR DETAILS FOR YOUR REGISTRATION*\n"
-                        "➡️ Email address\n➡️ Full name\n➡️ Username (e.g. @you)\n➡️ Phone number (with your country code)\n\n"
-                        "All in one message, each on its own line as seen.",
-                        parse_mode="Markdown"
-                    )
-                    await query.edit_message_text("Payment approved. Waiting for user details.")
-                except psycopg2.Error as e:
-                    logger.error(f"Database error in approve_reg: {e}")
-                    await query.edit_message_text("An error occurred. Please try again.")
-            elif parts[1] == "coupon":
-                payment_id = int(parts[2])
-                try:
-                    cursor.execute("UPDATE payments SET status='approved', approved_at=%s WHERE id=%s", (datetime.datetime.now(), payment_id))
-                    conn.commit()
-                    user_state[ADMIN_ID] = {'expecting': {'type': 'coupon_codes', 'payment_id': payment_id}}
-                    await context.bot.send_message(ADMIN_ID, f"Payment {payment_id} approved. Please send the coupon codes (one per line).")
-                    await query.edit_message_text("Payment approved. Waiting for coupon codes.")
-                except psycopg2.Error as e:
-                    logger.error(f"Database error in approve_coupon: {e}")
-                    await query.edit_message_text("An error occurred. Please try again.")
-            elif parts[1] == "task":
-                task_id = int(parts[2])
-                user_chat_id = int(parts[3])
-                try:
-                    cursor.execute("INSERT INTO user_tasks (user_id, task_id, completed_at) VALUES (%s, %s, %s)", (user_chat_id, task_id, datetime.datetime.now()))
-                    cursor.execute("SELECT reward FROM tasks WHERE id=%s", (task_id,))
-                    reward = cursor.fetchone()[0]
-                    cursor.execute("UPDATE users SET balance = balance + %s WHERE chat_id=%s", (reward, user_chat_id))
-                    conn.commit()
-                    await context.bot.send_message(user_chat_id, f"Task approved! You earned ${reward}.")
-                    await query.edit_message_text("Task approved and reward awarded.")
-                except psycopg2.Error as e:
-                    logger.error(f"Database error in approve_task: {e}")
-                    await query.edit_message_text("An error occurred. Please try again.")
-        elif data.startswith("finalize_reg_"):
-            user_chat_id = int(data.split("_")[2])
-            user_state[ADMIN_ID] = {'expecting': 'user_credentials', 'for_user': user_chat_id}
-            await context.bot.send_message(
-                ADMIN_ID,
-                f"Please send the username and password for user {user_chat_id} in the format:\nusername\npassword"
-            )
-            await query.edit_message_text("Waiting for user credentials.")
-        elif data.startswith("reject_task_"):
-            parts = data.split("_")
-            task_id = int(parts[2])
-            user_chat_id = int(parts[3])
-            try:
-                cursor.execute("SELECT balance FROM users WHERE chat_id=%s", (user_chat_id,))
-                balance = cursor.fetchone()[0]
-                cursor.execute("SELECT reward FROM tasks WHERE id=%s", (task_id,))
-                reward = cursor.fetchone()[0]
-                if balance >= reward:
-                    cursor.execute("UPDATE users SET balance = balance - %s WHERE chat_id=%s", (reward, user_chat_id))
-                    cursor.execute("DELETE FROM user_tasks WHERE user_id=%s AND task_id=%s", (user_chat_id, task_id))
-                    conn.commit()
-                    await context.bot.send_message(user_chat_id, "Task verification rejected. Reward revoked.")
-                    await query.edit_message_text("Task rejected and reward removed.")
-                else:
-                    await query.edit_message_text("Task rejected, but balance insufficient to revoke reward.")
-            except psycopg2.Error as e:
-                logger.error(f"Database error in reject_task: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data.startswith("pending_"):
-            parts = data.split("_")
-            if parts[1] == "reg":
-                await context.bot.send_message(int(parts[2]), "Your payment is still being reviewed. Please check back later.")
-            elif parts[1] == "coupon":
-                payment_id = int(parts[2])
-                try:
-                    cursor.execute("SELECT chat_id FROM payments WHERE id=%s", (payment_id,))
-                    user_chat_id = cursor.fetchone()[0]
-                    await context.bot.send_message(user_chat_id, "Your coupon payment is still being reviewed.")
-                except psycopg2.Error as e:
-                    logger.error(f"Database error in pending_coupon: {e}")
-                    await query.edit_message_text("An error occurred. Please try again.")
-        elif data == "check_approval":
-            if 'waiting_approval' not in user_state.get(chat_id, {}):
-                await context.bot.send_message(chat_id, "You have no pending payments.")
-                return
-            approval = user_state[chat_id]['waiting_approval']
-            if approval['type'] == 'registration':
-                status = get_status(chat_id)
-                if status == 'pending_details':
-                    await context.bot.send_message(chat_id, "Payment approved. Please send your details.")
-                elif status == 'registered':
-                    await context.bot.send_message(chat_id, "Your registration is complete.")
-                else:
-                    await context.bot.send_message(chat_id, "Your payment is being reviewed.")
-            elif approval['type'] == 'coupon':
-                payment_id = approval['payment_id']
-                try:
-                    cursor.execute("SELECT status FROM payments WHERE id=%s", (payment_id,))
-                    status = cursor.fetchone()[0]
-                    if status == 'approved':
-                        await context.bot.send_message(chat_id, "Coupon payment approved. Check your coupons above.")
-                    else:
-                        await context.bot.send_message(chat_id, "Your coupon payment is being reviewed.")
-                except psycopg2.Error as e:
-                    logger.error(f"Database error in check_approval: {e}")
-                    await context.bot.send_message(chat_id, "An error occurred. Please try again.")
-        elif data == "toggle_reminder":
-            try:
-                cursor.execute("SELECT alarm_setting FROM users WHERE chat_id=%s", (chat_id,))
-                current_setting = cursor.fetchone()[0]
-                new_setting = 1 if current_setting == 0 else 0
-                cursor.execute("UPDATE users SET alarm_setting=%s WHERE chat_id=%s", (new_setting, chat_id))
-                conn.commit()
-                status = "enabled" if new_setting == 1 else "disabled"
-                await query.edit_message_text(f"Daily reminder {status}.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
-            except psycopg2.Error as e:
-                logger.error(f"Database error in toggle_reminder: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data == "boost_ai":
+        else:
+            await query.edit_message_text("No registration data found.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
+    except psycopg.Error as e:
+        logger.error(f"Database error in user_registered: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.exact("daily_tasks")
+async def cb_daily_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        package = (await user_repo.get_profile(chat_id)).package
+        msg = f"Follow this link to perform your daily tasks and earn: {DAILY_TASK_LINK}"
+        if package == "X":
+            msg = f"🌟 X Users: Maximize your earnings with this special daily task link: {DAILY_TASK_LINK}"
+        await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
+    except psycopg.Error as e:
+        logger.error(f"Database error in daily_tasks: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.exact("earn_extra")
+async def cb_earn_extra(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        tasks = await task_repo.list_available(chat_id)
+        if not tasks:
             await query.edit_message_text(
-                f"🚀 Boost with AI\n\nAccess AI-powered features to maximize your earnings: {AI_BOOST_LINK}",
+                "No extra tasks available right now. Please check back later.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
             )
-        elif data == "user_registered":
-            try:
-                cursor.execute("SELECT username, email, password, package FROM users WHERE chat_id=%s", (chat_id,))
-                user = cursor.fetchone()
-                if user:
-                    username, email, password, package = user
-                    await query.edit_message_text(
-                        f"🎉 Registration Complete!\n\n"
-                        f"• Site: {SITE_LINK}\n"
-                        f"• Username: {username}\n"
-                        f"• Email: {email}\n"
-                        f"• Password: {password}\n\n"
-                        "Keep your credentials safe. Use 'Password Recovery' in the Help menu if needed.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
-                    )
-                else:
-                    await query.edit_message_text("No registration data found.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
-            except psycopg2.Error as e:
-                logger.error(f"Database error in user_registered: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data == "daily_tasks":
-            try:
-                cursor.execute("SELECT package FROM users WHERE chat_id=%s", (chat_id,))
-                package = cursor.fetchone()[0]
-                msg = f"Follow this link to perform your daily tasks and earn: {DAILY_TASK_LINK}"
-                if package == "X":
-                    msg = f"🌟 X Users: Maximize your earnings with this special daily task link: {DAILY_TASK_LINK}"
-                await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]]))
-            except psycopg2.Error as e:
-                logger.error(f"Database error in daily_tasks: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data == "earn_extra":
-            now = datetime.datetime.now()
-            try:
-                cursor.execute("""
-                SELECT t.id, t.type, t.link, t.reward
-                FROM tasks t
-                WHERE t.expires_at > %s
-                AND t.id NOT IN (SELECT ut.task_id FROM user_tasks ut WHERE ut.user_id = %s)
-                """, (now, chat_id))
-                tasks = cursor.fetchall()
-                if not tasks:
-                    await query.edit_message_text(
-                        "No extra tasks available right now. Please check back later.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
-                    )
-                    return
-                keyboard = []
-                for task in tasks:
-                    task_id, task_type, link, reward = task
-                    join_button = InlineKeyboardButton(f"Join {task_type} (${reward})", url=link)
-                    verify_button = InlineKeyboardButton("Verify", callback_data=f"verify_task_{task_id}")
-                    keyboard.append([join_button, verify_button])
-                keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-                await query.edit_message_text("Available extra tasks for today:", reply_markup=InlineKeyboardMarkup(keyboard))
-            except psycopg2.Error as e:
-                logger.error(f"Database error in earn_extra: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data.startswith("verify_task_"):
-            task_id = int(data[len("verify_task_"):])
+            return
+        keyboard = []
+        for task in tasks:
+            join_button = InlineKeyboardButton(f"Join {task.type} (${task.reward})", url=task.link)
+            verify_button = InlineKeyboardButton("Verify", callback_data=f"verify_task_{task.id}")
+            keyboard.append([join_button, verify_button])
+        keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
+        await query.edit_message_text("Available extra tasks for today:", reply_markup=InlineKeyboardMarkup(keyboard))
+    except psycopg.Error as e:
+        logger.error(f"Database error in earn_extra: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.prefix("verify_task_")
+async def cb_verify_task(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    task_id = int(payload)
+    try:
+        task = await task_repo.get(task_id)
+        if not task:
+            await query.answer("Task not found.")
+            return
+        if task_id in await task_repo.completed_task_ids(chat_id):
+            await query.answer("You have already completed this task.")
+            return
+        if task.type in ["join_group", "join_channel"]:
+            chat_username = task.link.split("/")[-1]
             try:
-                cursor.execute("SELECT type, link FROM tasks WHERE id=%s", (task_id,))
-                task = cursor.fetchone()
-                if not task:
-                    await query.answer("Task not found.")
-                    return
-                task_type, link = task
-                if task_type in ["join_group", "join_channel"]:
-                    chat_username = link.split("/")[-1]
-                    try:
-                        member = await context.bot.get_chat_member(chat_username, chat_id)
-                        if member.status in ["member", "administrator", "creator"]:
-                            cursor.execute("INSERT INTO user_tasks (user_id, task_id, completed_at) VALUES (%s, %s, %s)", (chat_id, task_id, datetime.datetime.now()))
-                            cursor.execute("SELECT reward FROM tasks WHERE id=%s", (task_id,))
-                            reward = cursor.fetchone()[0]
-                            cursor.execute("UPDATE users SET balance = balance + %s WHERE chat_id=%s", (reward, chat_id))
-                            conn.commit()
-                            await query.answer(f"Task completed! You earned ${reward}.")
-                        else:
-                            await query.answer("You are not in the group/channel yet.")
-                    except Exception as e:
-                        logger.error(f"Error verifying task: {e}")
-                        await query.answer("Error verifying task. Try again later.")
-                elif task_type == "external_task":
-                    user_state[chat_id] = {'expecting': 'task_screenshot', 'task_id': task_id}
-                    await context.bot.send_message(chat_id, f"Please send the screenshot for task #{task_id} verification.")
-            except psycopg2.Error as e:
-                logger.error(f"Database error in verify_task: {e}")
-                await query.answer("An error occurred. Please try again.")
-        elif data == "faq":
-            keyboard = [[InlineKeyboardButton(faq["question"], callback_data=f"faq_{key}")] for key, faq in FAQS.items()]
-            keyboard.append([InlineKeyboardButton("Ask Another Question", callback_data="faq_custom")])
-            keyboard.append([InlineKeyboardButton("🔙 Help Menu", callback_data="help")])
-            await query.edit_message_text("Select a question or ask your own:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data.startswith("faq_"):
-            faq_key = data[len("faq_"):]
-            if faq_key == "custom":
-                user_state[chat_id]['expecting'] = 'faq'
-                await query.edit_message_text("Please type your question:", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
-            else:
-                faq = FAQS.get(faq_key)
-                if faq:
-                    await query.edit_message_text(
-                        f"❓ {faq['question']}\n\n{faq['answer']}",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 అవసరం లేదు FAQ Menu", callback_data="faq"), InlineKeyboardButton("🔙 Help Menu", callback_data="help")]])
-                    )
+                if await membership.is_member(context.bot, chat_username, chat_id):
+                    reward = await task_repo.complete(chat_id, task_id)
+                    if reward is None:
+                        await query.answer("You have already completed this task.")
+                    else:
+                        await query.answer(f"Task completed! You earned ${reward}.")
                 else:
-                    await query.edit_message_text("FAQ not found.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]))
-        elif data in HELP_TOPICS:
-            topic = HELP_TOPICS[data]
-            keyboard = [[InlineKeyboardButton("🔙 Help Menu", callback_data="help")]]
-            if topic["type"] == "input":
-                user_state[chat_id]['expecting'] = data
-                await query.edit_message_text(topic["text"], reply_markup=InlineKeyboardMarkup(keyboard))
-            elif topic["type"] == "toggle":
-                keyboard = [
-                    [InlineKeyboardButton("Toggle Reminder On/Off", callback_data="toggle_reminder")],
-                    [InlineKeyboardButton("🔙 Help Menu", callback_data="help")]
-                ]
-                await query.edit_message_text("Toggle your daily reminder:", reply_markup=InlineKeyboardMarkup(keyboard))
-            elif topic["type"] == "faq":
-                await button_handler(update, context)  # Redirect to FAQ handler
-            else:
-                content = topic["text"] if topic["type"] == "text" else f"Watch here: {topic['url']}"
-                await query.edit_message_text(content, reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data == "help":
-            await help_menu(update, context)
-        elif data == "enable_reminders":
-            try:
-                cursor.execute("UPDATE users SET alarm_setting=1 WHERE chat_id=%s", (chat_id,))
-                conn.commit()
-                await query.edit_message_text(
-                    "✅ Daily reminders enabled!",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
-                )
-            except psycopg2.Error as e:
-                logger.error(f"Database error in enable_reminders: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
-        elif data == "disable_reminders":
-            try:
-                cursor.execute("UPDATE users SET alarm_setting=0 WHERE chat_id=%s", (chat_id,))
-                conn.commit()
-                await query.edit_message_text(
-                    "❌ Okay, daily reminders not set.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
-                )
-            except psycopg2.Error as e:
-                logger.error(f"Database error in disable_reminders: {e}")
-                await query.edit_message_text("An error occurred. Please try again.")
+                    await query.answer("You are not in the group/channel yet.")
+            except Exception as e:
+                logger.error(f"Error verifying task: {e}")
+                await query.answer("Error verifying task. Try again later.")
+        elif task.type == "external_task":
+            await state_store.set(chat_id, {'expecting': 'task_screenshot', 'task_id': task_id})
+            await context.bot.send_message(chat_id, f"Please send the screenshot for task #{task_id} verification.")
+    except psycopg.Error as e:
+        logger.error(f"Database error in verify_task: {e}")
+        await query.answer("An error occurred. Please try again.")
+
+@callback_router.exact("faq")
+async def cb_faq(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    template = templates["faq_menu"]
+    await update.callback_query.edit_message_text(template.text, reply_markup=template.reply_markup)
+
+@callback_router.prefix("faq_")
+async def cb_faq_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    faq_key = payload
+    if faq_key == "custom":
+        state = await state_store.get(chat_id)
+        state['expecting'] = 'faq'
+        await state_store.set(chat_id, state)
+    template = templates.get(f"faq_{faq_key}") or templates["faq_not_found"]
+    await query.edit_message_text(template.text, reply_markup=template.reply_markup)
+
+@callback_router.exact("help")
+async def cb_help(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    await help_menu(update, context)
+
+@callback_router.exact("enable_reminders")
+async def cb_enable_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        await user_repo.set_reminder(chat_id, True)
+        await query.edit_message_text(
+            "✅ Daily reminders enabled!",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
+        )
+    except psycopg.Error as e:
+        logger.error(f"Database error in enable_reminders: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+@callback_router.exact("disable_reminders")
+async def cb_disable_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    try:
+        await user_repo.set_reminder(chat_id, False)
+        await query.edit_message_text(
+            "❌ Okay, daily reminders not set.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
+        )
+    except psycopg.Error as e:
+        logger.error(f"Database error in disable_reminders: {e}")
+        await query.edit_message_text("An error occurred. Please try again.")
+
+async def cb_help_topic(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    chat_id = query.from_user.id
+    topic = HELP_TOPICS[query.data]
+    if topic["type"] == "faq":
+        await cb_faq(update, context, payload)
+        return
+    if topic["type"] == "input":
+        state = await state_store.get(chat_id)
+        state['expecting'] = query.data
+        await state_store.set(chat_id, state)
+    template = templates[f"help_{query.data}"]
+    await query.edit_message_text(template.text, reply_markup=template.reply_markup)
+
+# Help topics that don't already have a dedicated route (e.g. "faq", "daily_tasks") share one handler
+for topic_key in HELP_TOPICS:
+    if not callback_router.has_route(topic_key):
+        callback_router.add_exact(topic_key, cb_help_topic)
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    data = query.data
+    chat_id = query.from_user.id
+    logger.info(f"Received callback data: {data} from chat_id: {chat_id}")
+    await query.answer()
+    await log_interaction(chat_id, f"button_{data}")
+    try:
+        if not await callback_router.dispatch(update, context, data):
+            logger.warning(f"No callback route for: {data}")
     except Exception as e:
-        logger.error(f"Error in button_handler: {e}")
+        logger.error(f"Error in button_handler ({data}): {e}")
         await query.edit_message_text("An error occurred. Please try again or contact @bigscottmedia.")
 
 # Message handlers
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat_id
-    if 'expecting' not in user_state.get(chat_id, {}):
+    state = await state_store.get(chat_id)
+    if 'expecting' not in state:
         return
-    expecting = user_state[chat_id]['expecting']
+    expecting = state['expecting']
     photo_file = update.message.photo[-1].file_id
     try:
         if expecting == 'reg_screenshot':
-            cursor.execute("UPDATE users SET screenshot_uploaded_at=%s WHERE chat_id=%s", (datetime.datetime.now(), chat_id))
-            conn.commit()
-            cursor.execute("SELECT selected_coach FROM users WHERE chat_id=%s", (chat_id,))
-            selected_coach = cursor.fetchone()[0]
-            coach_name = "None"
-            if selected_coach:
-                cursor.execute("SELECT name FROM coaches WHERE coach_id=%s", (selected_coach,))
-                coach_name = cursor.fetchone()[0]
+            selected_coach = await user_repo.mark_screenshot(chat_id)
+            coach_name = await catalog.coach_name(selected_coach)
             keyboard = [
                 [InlineKeyboardButton("Approve", callback_data=f"approve_reg_{chat_id}")],
                 [InlineKeyboardButton("Pending", callback_data=f"pending_reg_{chat_id}")],
@@ -1117,10 +1232,10 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
             await update.message.reply_text("✅ Screenshot received! Awaiting admin approval.")
-            user_state[chat_id]['waiting_approval'] = {'type': 'registration'}
-            context.job_queue.run_once(check_registration_payment, 3600, data={'chat_id': chat_id})
+            state['waiting_approval'] = {'type': 'registration'}
+            await job_store.schedule("check_registration_payment", {'chat_id': chat_id}, delay=PAYMENT_FOLLOW_UP_DELAY)
         elif expecting == 'coupon_screenshot':
-            payment_id = user_state[chat_id]['waiting_approval']['payment_id']
+            payment_id = state['waiting_approval']['payment_id']
             keyboard = [
                 [InlineKeyboardButton("Approve", callback_data=f"approve_coupon_{payment_id}")],
                 [InlineKeyboardButton("Pending", callback_data=f"pending_coupon_{payment_id}")],
@@ -1132,9 +1247,9 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
             await update.message.reply_text("✅ Screenshot received! Awaiting admin approval.")
-            context.job_queue.run_once(check_coupon_payment, 3600, data={'payment_id': payment_id})
+            await job_store.schedule("check_coupon_payment", {'payment_id': payment_id}, delay=PAYMENT_FOLLOW_UP_DELAY)
         elif expecting == 'task_screenshot':
-            task_id = user_state[chat_id]['task_id']
+            task_id = state['task_id']
             await context.bot.send_photo(
                 ADMIN_ID,
                 photo_file,
@@ -1145,33 +1260,70 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 ])
             )
             await update.message.reply_text("Screenshot received. Awaiting admin approval.")
-        del user_state[chat_id]['expecting']
-        log_interaction(chat_id, "photo_upload")
+        del state['expecting']
+        await state_store.set(chat_id, state)
+        await log_interaction(chat_id, "photo_upload")
     except Exception as e:
         logger.error(f"Error in handle_photo: {e}")
         await update.message.reply_text("An error occurred. Please try again or contact @bigscottmedia.")
 
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat_id
+    if chat_id != ADMIN_ID:
+        return
+    state = await state_store.get(chat_id)
+    caption = update.message.caption or ""
+    if state.get('expecting') != 'task_import' and not caption.startswith("/import_tasks"):
+        return
+    document = update.message.document
+    name = (document.file_name or "").lower()
+    if name.endswith(".json") or document.mime_type == "application/json":
+        fmt = "json"
+    elif name.endswith(".csv") or document.mime_type == "text/csv":
+        fmt = "csv"
+    else:
+        await update.message.reply_text("Please upload a .csv or .json file.")
+        return
+    expiry_hours = state.get('expiry_hours', TASK_EXPIRY_HOURS)
+    caption_args = caption.split()[1:]
+    if caption_args:
+        try:
+            expiry_hours = parse_expiry_hours(caption_args[0])
+        except ValueError as e:
+            await update.message.reply_text(f"Nothing was imported: {e}. Usage: /import_tasks [expiry_hours] as the file caption.")
+            return
+    try:
+        content = bytes(await (await document.get_file()).download_as_bytearray()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await update.message.reply_text("The file must be UTF-8 text.")
+        return
+    state.pop('expecting', None)
+    state.pop('expiry_hours', None)
+    await state_store.set(chat_id, state)
+    await import_tasks_from(update, content, fmt, expiry_hours)
+
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat_id
     text = update.message.text
-    log_interaction(chat_id, "text_message")
-    logger.info(f"user_state[{chat_id}] = {user_state.get(chat_id, 'None')}")
-    if 'expecting' in user_state.get(chat_id, {}):
-        expecting = user_state[chat_id]['expecting']
+    await log_interaction(chat_id, "text_message")
+    state = await state_store.get(chat_id)
+    logger.info(f"user_state[{chat_id}] = {state or 'None'}")
+    if 'expecting' in state:
+        expecting = state['expecting']
         try:
             if expecting == 'coupon_quantity':
                 try:
                     quantity = int(text)
                     if quantity <= 0:
                         raise ValueError
-                    user_state[chat_id]['coupon_quantity'] = quantity
+                    state['coupon_quantity'] = quantity
                     keyboard = [
                         [InlineKeyboardButton("Standard (₦9,000)", callback_data="coupon_standard")],
                         [InlineKeyboardButton("X (₦14,000)", callback_data="coupon_x")],
                         [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")],
                     ]
                     await update.message.reply_text("Select the package for your coupons:", reply_markup=InlineKeyboardMarkup(keyboard))
-                    del user_state[chat_id]['expecting']
+                    del state['expecting']
                 except ValueError:
                     await update.message.reply_text("Please enter a valid positive integer.")
             elif expecting == 'other_country':
@@ -1185,7 +1337,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "Your request has been sent to the admin. Please contact @bigscottmedia to complete your registration.",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
-                del user_state[chat_id]['expecting']
+                del state['expecting']
             elif expecting == 'other_country_coupon':
                 country = text.strip()
                 await context.bot.send_message(
@@ -1197,19 +1349,17 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "Your request has been sent to the admin. Please contact @bigscottmedia to complete your coupon purchase.",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
-                del user_state[chat_id]['expecting']
+                del state['expecting']
             elif expecting == 'faq':
                 await context.bot.send_message(ADMIN_ID, f"FAQ from @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id}): {text}")
                 await update.message.reply_text("Thank you! We’ll get back to you soon.")
-                del user_state[chat_id]['expecting']
+                del state['expecting']
             elif expecting == 'password_recovery':
-                cursor.execute("SELECT username, email, password FROM users WHERE email=%s AND chat_id=%s AND payment_status='registered'", (text, chat_id))
-                user = cursor.fetchone()
+                user = await user_repo.find_registered_by_email(chat_id, text)
                 if user:
-                    username, email, _ = user
+                    username, email = user.username, user.email
                     new_password = secrets.token_urlsafe(8)
-                    cursor.execute("UPDATE users SET password=%s WHERE chat_id=%s", (new_password, chat_id))
-                    conn.commit()
+                    await user_repo.set_password(chat_id, new_password)
                     await context.bot.send_message(
                         chat_id,
                         f"Your password has been reset.\nNew Password: {new_password}\nKeep it safe and use 'Password Recovery' if needed again."
@@ -1220,73 +1370,53 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
                 else:
                     await update.message.reply_text("No account found with that email or you are not fully registered. Please try again or contact @bigscottmedia.")
-                del user_state[chat_id]['expecting']
+                del state['expecting']
             elif expecting == 'support_message':
                 await context.bot.send_message(
                     ADMIN_ID,
                     f"Support request from @{update.effective_user.username or 'Unknown'} (chat_id: {chat_id}): {text}"
                 )
                 await update.message.reply_text("Thank you! Our support team will get back to you soon.")
-                del user_state[chat_id]['expecting']
+                del state['expecting']
             elif isinstance(expecting, dict) and expecting.get('type') == 'coupon_codes' and chat_id == ADMIN_ID:
                 payment_id = expecting['payment_id']
                 codes = text.splitlines()
-                for code in codes:
-                    code = code.strip()
-                    if code:
-                        cursor.execute("INSERT INTO coupons (payment_id, code) VALUES (%s, %s)", (payment_id, code))
-                conn.commit()
-                cursor.execute("SELECT chat_id FROM payments WHERE id=%s", (payment_id,))
-                user_chat_id = cursor.fetchone()[0]
+                user_chat_id = await payment_repo.add_coupons(payment_id, [code.strip() for code in codes if code.strip()])
                 await context.bot.send_message(
                     user_chat_id,
                     "🎉 Your coupon purchase is approved!\n\nHere are your coupons:\n" + "\n".join(codes)
                 )
                 await update.message.reply_text("Coupons sent to the user successfully.")
-                del user_state[chat_id]['expecting']
+                del state['expecting']
+            elif expecting == 'task_import' and chat_id == ADMIN_ID:
+                await import_tasks_from(update, text, "lines", state.get('expiry_hours', TASK_EXPIRY_HOURS))
+                del state['expecting']
+                state.pop('expiry_hours', None)
             elif expecting == 'broadcast_message' and chat_id == ADMIN_ID:
                 logger.info(f"Sending broadcast: {text}")
-                cursor.execute("SELECT chat_id FROM users WHERE payment_status='registered'")
-                user_ids = [row[0] for row in cursor.fetchall()]
-                for user_id in user_ids:
-                    try:
-                        await context.bot.send_message(user_id, f"📢 Broadcast: {text}")
-                    except Exception as e:
-                        logger.error(f"Failed to send broadcast to {user_id}: {e}")
-                await update.message.reply_text(f"Broadcast sent to {len(user_ids)} users.")
-                del user_state[chat_id]['expecting']
+                broadcast_id = await broadcaster.create("registered", f"📢 Broadcast: {text}", created_by=chat_id)
+                await update.message.reply_text(
+                    f"Broadcast #{broadcast_id} started. You will get a report when it finishes; use /broadcast_status to check progress."
+                )
+                del state['expecting']
             elif expecting == 'user_credentials' and chat_id == ADMIN_ID:
                 lines = text.splitlines()
                 if len(lines) != 2:
                     await update.message.reply_text("Please send username and password in two lines.")
                     return
                 username, password = lines
-                for_user = user_state[chat_id]['for_user']
-                cursor.execute(
-                    "UPDATE users SET username=%s, password=%s, payment_status='registered', registration_date=%s WHERE chat_id=%s",
-                    (username, password, datetime.datetime.now(), for_user)
-                )
-                conn.commit()
-                cursor.execute("SELECT package, referred_by, selected_coach FROM users WHERE chat_id=%s", (for_user,))
-                row = cursor.fetchone()
-                if row:
-                    package, referred_by, selected_coach = row
-                    if referred_by:
-                        additional_reward = 0.4 if package == "Standard" else 0.9
-                        cursor.execute("UPDATE users SET balance = balance + %s WHERE chat_id=%s", (additional_reward, referred_by))
-                        conn.commit()
+                for_user = state['for_user']
+                profile = await user_repo.finalize_registration(for_user, username, password)
+                selected_coach = profile.selected_coach if profile else None
                 await context.bot.send_message(
                     for_user,
                     f"🎉 Registration successful! Your username is\n {username}\n and password is\n {password}\n\n Join the group using the link below to keep up with info:\n {GROUP_LINK}"
                 )
-                cursor.execute("SELECT package, email, name, phone FROM users WHERE chat_id=%s", (for_user,))
-                user_details = cursor.fetchone()
+                user_details = await user_repo.get_details(for_user)
                 if user_details:
-                    pkg, email, full_name, phone = user_details
-                    coach_name = "None"
+                    pkg, email, full_name, phone = user_details.package, user_details.email, user_details.name, user_details.phone
+                    coach_name = await catalog.coach_name(selected_coach)
                     if selected_coach:
-                        cursor.execute("SELECT name FROM coaches WHERE coach_id=%s", (selected_coach,))
-                        coach_name = cursor.fetchone()[0]
                         await context.bot.send_message(
                             selected_coach,
                             f"New registration under your coaching:\nUser ID: {for_user}\nUsername: {username}\nPackage: {pkg}\nEmail: {email}\nName: {full_name}\nPhone: {phone}"
@@ -1301,12 +1431,13 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     [InlineKeyboardButton("No, disable reminders", callback_data="disable_reminders")],
                 ]
                 await context.bot.send_message(for_user, "Would you like to receive daily reminders to complete your tasks?", reply_markup=InlineKeyboardMarkup(keyboard))
-                del user_state[chat_id]
+                state.clear()
+            await state_store.set(chat_id, state)
         except Exception as e:
             logger.error(f"Error in handle_text: {e}")
             await update.message.reply_text("An error occurred. Please try again or contact @bigscottmedia.")
     else:
-        status = get_status(chat_id)
+        status = await get_status(chat_id, fresh=True)
         if status == 'pending_details':
             lines = [l.strip() for l in text.splitlines() if l.strip()]
             if len(lines) < 4:
@@ -1321,12 +1452,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
             password = secrets.token_urlsafe(8)
             try:
-                cursor.execute(
-                    "UPDATE users SET email=%s, name=%s, username=%s, phone=%s, password=%s WHERE chat_id=%s",
-                    (email, full_name, username, phone, password, chat_id)
-                )
-                conn.commit()
-                pkg = cursor.execute("SELECT package FROM users WHERE chat_id=%s", (chat_id,)).fetchone()[0]
+                pkg = await user_repo.save_details(chat_id, email, full_name, username, phone, password)
                 keyboard = [[InlineKeyboardButton("Finalize Registration", callback_data=f"finalize_reg_{chat_id}")]]
                 await context.bot.send_message(
                     ADMIN_ID,
@@ -1337,86 +1463,89 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "✅ Details received! Awaiting admin finalization.",
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]])
                 )
-            except psycopg2.Error as e:
+            except psycopg.Error as e:
                 logger.error(f"Database error in pending_details: {e}")
                 await update.message.reply_text("An error occurred. Please try again.")
 
 # Job functions
-async def check_registration_payment(context: ContextTypes.DEFAULT_TYPE):
-    chat_id = context.job.data['chat_id']
-    status = get_status(chat_id)
+# Payment follow-ups run from the persistent job store as handler(bot, data), not from the in-memory job queue
+async def check_registration_payment(bot, data):
+    chat_id = data['chat_id']
+    status = await get_status(chat_id, fresh=True)
     if status == 'pending_payment':
-        cursor.execute("SELECT selected_coach FROM users WHERE chat_id=%s", (chat_id,))
-        selected_coach = cursor.fetchone()[0]
+        selected_coach = (await user_repo.get_profile(chat_id)).selected_coach
         if selected_coach:
-            await context.bot.send_message(
+            await bot.send_message(
                 selected_coach,
                 f"Reminder: User (chat_id: {chat_id}) has not completed registration within the time limit."
             )
         keyboard = [[InlineKeyboardButton("Payment Approval Stats", callback_data="check_approval")]]
-        await context.bot.send_message(chat_id, "Your payment is still being reviewed. Click below to check status:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await bot.send_message(chat_id, "Your payment is still being reviewed. Click below to check status:", reply_markup=InlineKeyboardMarkup(keyboard))
 
-async def check_coupon_payment(context: ContextTypes.DEFAULT_TYPE):
-    payment_id = context.job.data['payment_id']
+async def check_coupon_payment(bot, data):
+    payment_id = data['payment_id']
     try:
-        cursor.execute("SELECT status, chat_id FROM payments WHERE id=%s", (payment_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 'pending_payment':
-            chat_id = row[1]
+        payment = await payment_repo.get(payment_id)
+        if payment and payment.status == 'pending_payment':
+            chat_id = payment.chat_id
             keyboard = [[InlineKeyboardButton("Payment Approval Stats", callback_data="check_approval")]]
-            await context.bot.send_message(chat_id, "Your coupon payment is still being reviewed. Click below to check status:", reply_markup=InlineKeyboardMarkup(keyboard))
-    except psycopg2.Error as e:
+            await bot.send_message(chat_id, "Your coupon payment is still being reviewed. Click below to check status:", reply_markup=InlineKeyboardMarkup(keyboard))
+    except psycopg.Error as e:
         logger.error(f"Database error in check_coupon_payment: {e}")
 
+# Runs hourly: each run reaches the subscribers whose local time is REMINDER_HOUR
 async def daily_reminder(context: ContextTypes.DEFAULT_TYPE):
     try:
-        cursor.execute("SELECT chat_id FROM users WHERE alarm_setting=1")
-        user_ids = [row[0] for row in cursor.fetchall()]
-        for user_id in user_ids:
-            try:
-                await context.bot.send_message(user_id, "🌟 Daily Reminder: Complete your Ethereal tasks to maximize your earnings!")
-                log_interaction(user_id, "daily_reminder")
-            except Exception as e:
-                logger.error(f"Failed to send reminder to {user_id}: {e}")
-    except psycopg2.Error as e:
+        await reminder_dispatcher.start(context.bot)
+    except psycopg.Error as e:
         logger.error(f"Database error in daily_reminder: {e}")
 
+def format_daily_summary(label, summary):
+    return (
+        f"📊 Daily Summary ({label}):\n\n"
+        f"• New Users: {summary.new_users}\n"
+        f"• Total Payments Approved: ₦{summary.registration_revenue + summary.coupon_revenue}\n"
+        f"• Tasks Completed: {summary.tasks_completed}\n"
+        f"• Total Balance Distributed: ${summary.rewards_cents / 100:.2f}"
+    )
+
+# Runs just after midnight so the report covers the whole of the previous day
 async def daily_summary(context: ContextTypes.DEFAULT_TYPE):
-    now = datetime.datetime.now()
-    start_time = now - datetime.timedelta(days=1)
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
     try:
-        cursor.execute("SELECT COUNT(*) FROM users WHERE registration_date >= %s", (start_time,))
-        new_users = cursor.fetchone()[0]
-        cursor.execute("""
-        SELECT SUM(CASE package WHEN 'Standard' THEN 9000 WHEN 'X' THEN 14000 ELSE 0 END)
-        FROM users
-        WHERE approved_at >= %s AND payment_status = 'registered'
-        """, (start_time,))
-        reg_payments = cursor.fetchone()[0] or 0
-        cursor.execute("SELECT SUM(total_amount) FROM payments WHERE approved_at >= %s AND status = 'approved'", (start_time,))
-        coupon_payments = cursor.fetchone()[0] or 0
-        total_payments = reg_payments + coupon_payments
-        cursor.execute("SELECT COUNT(*) FROM user_tasks WHERE completed_at >= %s", (start_time,))
-        tasks_completed = cursor.fetchone()[0]
-        cursor.execute("""
-        SELECT SUM(t.reward)
-        FROM user_tasks ut
-        JOIN tasks t ON ut.task_id = t.id
-        WHERE ut.completed_at >= %s
-        """, (start_time,))
-        total_distributed = cursor.fetchone()[0] or 0
-        text = (
-            f"📊 Daily Summary ({now.strftime('%Y-%m-%d')}):\n\n"
-            f"• New Users: {new_users}\n"
-            f"• Total Payments Approved: ₦{total_payments}\n"
-            f"• Tasks Completed: {tasks_completed}\n"
-            f"• Total Balance Distributed: ${total_distributed}"
-        )
-        await context.bot.send_message(ADMIN_ID, text)
-    except psycopg2.Error as e:
+        summary = await stats_repo.daily_summary(yesterday)
+        await context.bot.send_message(ADMIN_ID, format_daily_summary(yesterday.isoformat(), summary))
+    except psycopg.Error as e:
         logger.error(f"Database error in daily_summary: {e}")
         await context.bot.send_message(ADMIN_ID, "Error generating daily summary.")
 
+async def interaction_maintenance(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        result = await interaction_retention.run()
+        logger.info(f"Interaction partitions: {result['created']} created, {result['dropped']} rolled up and dropped")
+    except psycopg.Error as e:
+        logger.error(f"Database error in interaction_maintenance: {e}")
+
+async def reconcile_balances(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        drifted = await ledger_repo.reconcile()
+        if drifted is None:
+            logger.info("Balance reconciliation skipped: another worker is running it")
+            return
+        for chat_id, stored, expected in drifted:
+            logger.warning(f"Balance drift for {chat_id}: stored {stored} cents, ledger {expected} cents; corrected")
+        logger.info(f"Balance reconciliation: {len(drifted)} balances corrected")
+    except psycopg.Error as e:
+        logger.error(f"Database error in reconcile_balances: {e}")
+
+async def purge_expired_states(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        purged = await state_store.purge()
+        if purged:
+            logger.info(f"Purged {purged} expired conversation states")
+    except psycopg.Error as e:
+        logger.error(f"Database error in purge_expired_states: {e}")
+
 # Channel handler
 async def channel_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == "/help":
@@ -1430,58 +1559,80 @@ async def channel_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     try:
-        cursor.execute("SELECT payment_status, package FROM users WHERE chat_id=%s", (chat_id,))
-        user = cursor.fetchone()
-        keyboard = [
-            [InlineKeyboardButton("How It Works", callback_data="how_it_works")],
-            [InlineKeyboardButton("Purchase Coupon", callback_data="coupon")],
-            [InlineKeyboardButton("💸 Register & Make Payment", callback_data="package_selector")],
-            [InlineKeyboardButton("❓ Help", callback_data="help")],
-        ]
-        if user and user[0] == 'registered':
-            keyboard = [
-                [InlineKeyboardButton("📊 My Stats", callback_data="stats")],
-                [InlineKeyboardButton("Do Daily Tasks", callback_data="daily_tasks")],
-                [InlineKeyboardButton("💰 Earn Extra for the Day", callback_data="earn_extra")],
-                [InlineKeyboardButton("Purchase Coupon", callback_data="coupon")],
-                [InlineKeyboardButton("❓ Help", callback_data="help")],
-            ]
-            if user[1] == "X":
-                keyboard.insert(1, [InlineKeyboardButton("🚀 Boost with AI", callback_data="boost_ai")])
-        text = "Select an option below:"
+        user = await user_repo.get_profile(chat_id)
+        if user and user.payment_status == 'registered':
+            template = templates["main_menu_x" if user.package == "X" else "main_menu_registered"]
+        else:
+            template = templates["main_menu_guest"]
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+            await update.callback_query.edit_message_text(template.text, reply_markup=template.reply_markup)
         else:
-            await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
-        log_interaction(chat_id, "show_main_menu")
-    except psycopg2.Error as e:
+            await update.message.reply_text(template.text, reply_markup=template.reply_markup)
+        await log_interaction(chat_id, "show_main_menu")
+    except psycopg.Error as e:
         logger.error(f"Database error in show_main_menu: {e}")
         await update.message.reply_text("An error occurred. Please try again.")
 
 async def help_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.callback_query.from_user.id
-    status = get_status(chat_id)
-    keyboard = [[InlineKeyboardButton(topic["label"], callback_data=key)] for key, topic in HELP_TOPICS.items()]
-    if status == 'registered':
-        keyboard.append([InlineKeyboardButton("👥 Refer a Friend", callback_data="refer_friend")])
-    keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
-    query = update.callback_query
-    await query.edit_message_text("What would you like help with?", reply_markup=InlineKeyboardMarkup(keyboard))
-    log_interaction(chat_id, "help_menu")
+    status = await get_status(chat_id)
+    template = templates["help_menu_registered" if status == 'registered' else "help_menu_guest"]
+    await update.callback_query.edit_message_text(template.text, reply_markup=template.reply_markup)
+    await log_interaction(chat_id, "help_menu")
 
 # Main
+async def post_init(application: Application):
+    await db.open_pool(DATABASE_URL, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, timeout=DB_POOL_TIMEOUT)
+    await init_schema()
+    # Catches up on partitions and retention missed while the bot was down; rows land in the default partition meanwhile
+    try:
+        result = await interaction_retention.run()
+        logger.info(f"Interaction partitions: {result['created']} created, {result['dropped']} rolled up and dropped")
+    except psycopg.Error as e:
+        logger.error(f"Database error in interaction retention at startup: {e}")
+    await interaction_writer.start()
+    await broadcaster.start(application.bot)
+    await reminder_dispatcher.resume(application.bot)
+    job_store.start(application.bot)
+
+async def post_shutdown(application: Application):
+    await reminder_dispatcher.stop()
+    await job_store.stop()
+    await broadcaster.stop()
+    await state_store.close()
+    await interaction_writer.stop()
+    await db.close_pool()
+
 def main():
+    job_store.register("check_registration_payment", check_registration_payment)
+    job_store.register("check_coupon_payment", check_coupon_payment)
     try:
-        application = Application.builder().token(BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .concurrent_updates(update_processor)
+            .build()
+        )
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("menu", show_main_menu))
         application.add_handler(CommandHandler("stats", stats))
         application.add_handler(CommandHandler("reset", reset_state))
         application.add_handler(CommandHandler("broadcast", broadcast))
+        application.add_handler(CommandHandler("broadcast_status", broadcast_status))
+        application.add_handler(CommandHandler("reminder_stats", reminder_stats))
+        application.add_handler(CommandHandler("route_stats", route_stats))
         application.add_handler(CommandHandler("botstats", botstats))
         application.add_handler(CommandHandler("registered_users", registered_users))
         application.add_handler(CommandHandler("add_task", add_task))
+        application.add_handler(CommandHandler("import_tasks", import_tasks))
+        application.add_handler(CommandHandler("expire_tasks", expire_tasks))
+        application.add_handler(CommandHandler("delete_tasks", delete_tasks))
+        application.add_handler(CommandHandler("export", export))
+        application.add_handler(CommandHandler("summary", summary))
         application.add_handler(CommandHandler("support", support))
+        application.add_handler(CommandHandler("timezone", timezone))
         application.add_handler(CommandHandler("coach", apply_coach))
         application.add_handler(CommandHandler("addcoach", add_coach))
         application.add_handler(CommandHandler("list_coaches", list_coaches))
@@ -1493,13 +1644,21 @@ def main():
         application.add_handler(CommandHandler("list_accounts", list_accounts))
         application.add_handler(CallbackQueryHandler(button_handler))
         application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+        application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
         # Replace with your actual channel ID
         channel_id = int(os.getenv("CHANNEL_ID", -1002028515715))
         application.add_handler(MessageHandler(filters.Chat(channel_id) & filters.TEXT, channel_message))
-        application.job_queue.run_daily(daily_reminder, time=datetime.time(hour=8, minute=0))
-        application.job_queue.run_daily(daily_summary, time=datetime.time(hour=20, minute=0))
-        application.run_polling()
+        next_hour = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        application.job_queue.run_repeating(daily_reminder, interval=3600, first=next_hour)
+        application.job_queue.run_daily(daily_summary, time=datetime.time(hour=0, minute=5))
+        application.job_queue.run_repeating(purge_expired_states, interval=3600, first=60)
+        application.job_queue.run_daily(interaction_maintenance, time=datetime.time(hour=0, minute=15))
+        application.job_queue.run_daily(reconcile_balances, time=datetime.time(hour=3, minute=30))
+        if BOT_MODE == "webhook":
+            run_webhook(application)
+        else:
+            application.run_polling()
     except Exception as e:
         logger.error(f"Error in main: {e}")
         print("Failed to start bot. Check logs for details.")
@@ -0,0 +1,69 @@
+# Compares rebuilding the static menus per render (old handlers) with serving them from the template registry.
+# Usage: python benchmark_templates.py [iterations]
+import sys
+import time
+import tracemalloc
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from templates import FAQS, HELP_TOPICS, HOW_IT_WORKS_TEXT, templates
+
+def render_per_call():
+    # Mirrors what show_main_menu, help_menu, the faq branch and how_it_works built on every tap
+    main_menu = [
+        [InlineKeyboardButton("📊 My Stats", callback_data="stats")],
+        [InlineKeyboardButton("Do Daily Tasks", callback_data="daily_tasks")],
+        [InlineKeyboardButton("💰 Earn Extra for the Day", callback_data="earn_extra")],
+        [InlineKeyboardButton("Purchase Coupon", callback_data="coupon")],
+        [InlineKeyboardButton("❓ Help", callback_data="help")],
+    ]
+    main_menu.insert(1, [InlineKeyboardButton("🚀 Boost with AI", callback_data="boost_ai")])
+    help_menu = [[InlineKeyboardButton(topic["label"], callback_data=key)] for key, topic in HELP_TOPICS.items()]
+    help_menu.append([InlineKeyboardButton("👥 Refer a Friend", callback_data="refer_friend")])
+    help_menu.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
+    faq_menu = [[InlineKeyboardButton(faq["question"], callback_data=f"faq_{key}")] for key, faq in FAQS.items()]
+    faq_menu.append([InlineKeyboardButton("Ask Another Question", callback_data="faq_custom")])
+    faq_menu.append([InlineKeyboardButton("🔙 Help Menu", callback_data="help")])
+    how_it_works = [
+        [InlineKeyboardButton("💎Get Started", callback_data="package_selector")],
+        [InlineKeyboardButton("🔙 Main Menu", callback_data="menu")]
+    ]
+    return (
+        ("Select an option below:", InlineKeyboardMarkup(main_menu)),
+        ("What would you like help with?", InlineKeyboardMarkup(help_menu)),
+        ("Select a question or ask your own:", InlineKeyboardMarkup(faq_menu)),
+        (HOW_IT_WORKS_TEXT, InlineKeyboardMarkup(how_it_works)),
+    )
+
+def render_from_registry():
+    return (
+        templates["main_menu_x"],
+        templates["help_menu_registered"],
+        templates["faq_menu"],
+        templates["how_it_works"],
+    )
+
+def measure(render, iterations):
+    render()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [render() for _ in range(100)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return elapsed / iterations * 1e6, allocated / 100
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'render':<12}{'µs/render':>12}{'bytes/render':>15}")
+    for name, render in (("per-call", render_per_call), ("registry", render_from_registry)):
+        latency, allocated = measure(render, iterations)
+        print(f"{name:<12}{latency:>12.2f}{allocated:>15.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import asyncio
+import datetime
+import logging
+import os
+import uuid
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import db
+from interaction_log import interaction_writer
+
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))  # messages per second across all fan-outs
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", 1))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 10))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", 200))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", 3))
+BROADCAST_LEASE = int(os.getenv("BROADCAST_LEASE", 300))  # seconds a worker's claim on a running broadcast lasts between checkpoints
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"  # the chat is unreachable: bot blocked, account deactivated or chat not found
+
+# Recipients are walked in chat_id order so progress can be checkpointed as "last chat_id done"
+AUDIENCES = {
+    "registered": (
+        "SELECT chat_id FROM users WHERE payment_status='registered' AND unreachable_since IS NULL "
+        "AND chat_id > %s ORDER BY chat_id LIMIT %s"
+    ),
+}
+
+MIN_CHAT_ID = -(2 ** 63)
+
+# Spaces sends to stay under Telegram's global limit and the per-chat limit
+class RateLimiter:
+    def __init__(self, rate=25, per_chat_interval=1.0):
+        self.interval = 1.0 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._chat_next = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self.interval
+            send_at = max(slot, self._chat_next.get(chat_id, 0.0))
+            self._chat_next[chat_id] = send_at + self.per_chat_interval
+            if len(self._chat_next) > 10000:
+                self._chat_next = {key: ready for key, ready in self._chat_next.items() if ready > now}
+        delay = send_at - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # Called on RetryAfter: every sender waits out the flood-control window, not just the one that hit it
+    def pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+send_limiter = RateLimiter(rate=BROADCAST_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL)
+
+async def send_message(bot, chat_id, text, limiter=send_limiter, max_attempts=BROADCAST_MAX_ATTEMPTS, **kwargs):
+    for attempt in range(max_attempts):
+        await limiter.acquire(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return SENT
+        except RetryAfter as e:
+            logger.warning(f"Flood control hit sending to {chat_id}, retrying in {e.retry_after}s")
+            limiter.pause(e.retry_after)
+        except Forbidden:
+            return BLOCKED
+        except BadRequest as e:
+            if "chat not found" in e.message.lower():
+                return BLOCKED
+            logger.error(f"Failed to send message to {chat_id}: {e}")
+            return FAILED
+        except NetworkError as e:
+            logger.warning(f"Network error sending to {chat_id} (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
+        except TelegramError as e:
+            logger.error(f"Failed to send message to {chat_id}: {e}")
+            return FAILED
+    return FAILED
+
+# Users a fan-out found unreachable are flagged in users.unreachable_since and left out of every
+# later fan-out until they send /start again
+class DeliveryTracker:
+    MARK_UNREACHABLE = "UPDATE users SET unreachable_since=%s WHERE chat_id = ANY(%s) AND unreachable_since IS NULL"
+    MARK_REACHABLE = "UPDATE users SET unreachable_since=NULL WHERE chat_id=%s AND unreachable_since IS NOT NULL"
+
+    def __init__(self):
+        self.marked = 0
+        self.restored = 0
+
+    # One statement per page of results rather than one per blocked user
+    async def mark_unreachable(self, chat_ids):
+        if not chat_ids:
+            return 0
+        marked = await db.execute(self.MARK_UNREACHABLE, (datetime.datetime.now(), list(chat_ids)), prepare=True)
+        self.marked += marked
+        return marked
+
+    # Returns True when the user had been marked unreachable
+    async def mark_reachable(self, chat_id):
+        restored = await db.execute(self.MARK_REACHABLE, (chat_id,), prepare=True) > 0
+        self.restored += restored
+        return restored
+
+    def stats(self):
+        return {"marked": self.marked, "restored": self.restored}
+
+delivery_tracker = DeliveryTracker()
+
+# Sends one message to an audience with bounded concurrency, checkpointing progress in the broadcasts table.
+# Each running broadcast is leased to one worker; every checkpoint renews the lease, and a broadcast whose
+# worker died is claimed by whichever worker next finds the lease lapsed.
+class BroadcastEngine:
+    CLAIM = """
+    UPDATE broadcasts SET lease_owner=%(owner)s, lease_until=%(lease_until)s
+    WHERE status='running' AND (lease_until IS NULL OR lease_until < %(now)s)
+    RETURNING id
+    """
+    CHECKPOINT = """
+    UPDATE broadcasts SET last_chat_id=%s, sent=%s, failed=%s, blocked=%s, lease_until=%s
+    WHERE id=%s AND lease_owner=%s
+    """
+    RENEW = "UPDATE broadcasts SET lease_until=%s WHERE id=%s AND lease_owner=%s AND status='running'"
+    FINISH = "UPDATE broadcasts SET status='finished', finished_at=%s, lease_until=NULL WHERE id=%s AND lease_owner=%s"
+    RELEASE = "UPDATE broadcasts SET lease_until=NULL WHERE id = ANY(%s) AND lease_owner=%s"
+
+    def __init__(self, limiter, concurrency=10, page_size=200, lease=300):
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.bot = None
+        self._tasks = {}
+        self._poller = None
+
+    async def start(self, bot):
+        self.bot = bot
+        await self.claim()
+        self._poller = asyncio.create_task(self._poll())
+
+    # Running broadcasts stay 'running' in the table; releasing the lease lets the next start resume them at once
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        held = list(self._tasks)
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        if held:
+            await db.execute(self.RELEASE, (held, self.owner))
+
+    def _lease_until(self):
+        return datetime.datetime.now() + datetime.timedelta(seconds=self.lease)
+
+    # Takes over every running broadcast nobody holds a current lease on; returns how many were claimed
+    async def claim(self):
+        rows = await db.fetchall(self.CLAIM, {
+            "owner": self.owner,
+            "now": datetime.datetime.now(),
+            "lease_until": self._lease_until(),
+        })
+        for (broadcast_id,) in rows:
+            if broadcast_id not in self._tasks:
+                logger.info(f"Resuming broadcast #{broadcast_id}")
+                self._spawn(broadcast_id)
+        return len(rows)
+
+    async def _poll(self):
+        while True:
+            # Well inside the lease, so a dead worker's broadcast waits little more than one lease to be taken over
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast lease poll failed: {e}")
+
+    async def create(self, audience, message, created_by=None, log_action=None):
+        if audience not in AUDIENCES:
+            raise ValueError(f"Unknown broadcast audience: {audience}")
+        row = await db.fetchone(
+            "INSERT INTO broadcasts (audience, message, created_by, log_action, lease_owner, lease_until) "
+            "VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+            (audience, message, created_by, log_action, self.owner, self._lease_until())
+        )
+        self._spawn(row[0])
+        return row[0]
+
+    def _spawn(self, broadcast_id):
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def _run(self, broadcast_id):
+        try:
+            await self.run(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast #{broadcast_id} stopped with an error: {e}")
+
+    async def run(self, broadcast_id):
+        row = await db.fetchone(
+            "SELECT audience, message, created_by, log_action, last_chat_id, sent, failed, blocked FROM broadcasts WHERE id=%s",
+            (broadcast_id,)
+        )
+        audience, message, created_by, log_action, last_chat_id, sent, failed, blocked = row
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        lease_expires = 0.0
+
+        async def deliver(chat_id):
+            async with semaphore:
+                # A page that outlives the lease (e.g. a long flood-control pause) stops sending rather than
+                # racing the worker that may already be resuming it
+                if loop.time() >= lease_expires:
+                    return chat_id, None
+                return chat_id, await send_message(self.bot, chat_id, message, limiter=self.limiter)
+
+        cursor = last_chat_id if last_chat_id is not None else MIN_CHAT_ID
+        while True:
+            recipients = [r[0] for r in await db.fetchall(AUDIENCES[audience], (cursor, self.page_size))]
+            if not recipients:
+                break
+            # Renewed before every page, so a page is never sent once another worker may have resumed it
+            renewed_at = loop.time()
+            if not await db.execute(self.RENEW, (self._lease_until(), broadcast_id, self.owner)):
+                logger.warning(f"Broadcast #{broadcast_id} was claimed by another worker, stopping here")
+                return
+            lease_expires = renewed_at + self.lease
+            results = await asyncio.gather(*(deliver(chat_id) for chat_id in recipients))
+            if any(outcome is None for _, outcome in results):
+                # Not checkpointed: whoever resumes starts again from the previous page boundary
+                logger.warning(f"Broadcast #{broadcast_id} lease ran out mid-page, stopping here")
+                return
+            await delivery_tracker.mark_unreachable([chat_id for chat_id, outcome in results if outcome == BLOCKED])
+            for chat_id, outcome in results:
+                if outcome == SENT:
+                    sent += 1
+                    if log_action:
+                        await interaction_writer.log(chat_id, log_action)
+                elif outcome == BLOCKED:
+                    blocked += 1
+                else:
+                    failed += 1
+            cursor = recipients[-1]
+            renewed = await db.execute(
+                self.CHECKPOINT, (cursor, sent, failed, blocked, self._lease_until(), broadcast_id, self.owner)
+            )
+            if not renewed:
+                # The lease lapsed and another worker took over from the last checkpoint
+                logger.warning(f"Broadcast #{broadcast_id} was claimed by another worker, stopping here")
+                return
+        await db.execute(self.FINISH, (datetime.datetime.now(), broadcast_id, self.owner))
+        logger.info(f"Broadcast #{broadcast_id} finished: sent={sent} failed={failed} blocked={blocked}")
+        if created_by:
+            await send_message(
+                self.bot,
+                created_by,
+                f"📢 Broadcast #{broadcast_id} finished.\n\n• Sent: {sent}\n• Failed: {failed}\n• Blocked: {blocked}"
+            )
+
+    async def recent(self, limit=5):
+        return await db.fetchall(
+            "SELECT id, audience, status, sent, failed, blocked, created_at FROM broadcasts ORDER BY id DESC LIMIT %s",
+            (limit,)
+        )
+
+broadcaster = BroadcastEngine(
+    send_limiter, concurrency=BROADCAST_CONCURRENCY, page_size=BROADCAST_PAGE_SIZE, lease=BROADCAST_LEASE
+)
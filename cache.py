@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+# In-process LRU cache with per-entry TTL and hit/miss counters
+class TTLCache:
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = OrderedDict()
+        # Bumped on every invalidation so a read that raced with a write never repopulates a stale row
+        self._epoch = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, epoch=None):
+        if epoch is not None and epoch != self._epoch:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys):
+        self._epoch += 1
+        for key in keys:
+            if key is not None and self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self._epoch += 1
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from repositories import coach_repo, payment_repo
+
+# Admin commands invalidate this process immediately; other workers pick the change up within the TTL
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", 300))
+
+# Immutable view of the active payment accounts and coaches, with their pickers prebuilt
+class CatalogSnapshot:
+    def __init__(self, accounts, coaches):
+        self.accounts = tuple(accounts)
+        self.coaches = tuple(coaches)
+        self.accounts_by_country = {account.country: account for account in self.accounts}
+        self.coaches_by_id = {coach.coach_id: coach for coach in self.coaches}
+        self.loaded_at = time.monotonic()
+        self.coupon_country_keyboard = self._country_keyboard("coupon_country_")
+        self.reg_country_keyboard = self._country_keyboard("reg_country_")
+        self.coach_keyboard = None
+        if self.coaches:
+            keyboard = [[InlineKeyboardButton(f"{coach.name}", callback_data=f"select_coach_{coach.coach_id}")] for coach in self.coaches]
+            keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
+            self.coach_keyboard = InlineKeyboardMarkup(keyboard)
+
+    def _country_keyboard(self, prefix):
+        if not self.accounts:
+            return None
+        keyboard = [[InlineKeyboardButton(f"{account.flag} {account.country}", callback_data=f"{prefix}{account.country}")] for account in self.accounts]
+        keyboard.append([InlineKeyboardButton("Others", callback_data=f"{prefix}others")])
+        keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data="menu")])
+        return InlineKeyboardMarkup(keyboard)
+
+class Catalog:
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.loads = 0
+        self._snapshot = None
+        self._lock = asyncio.Lock()
+        # Same epoch trick as TTLCache: a load that raced with an invalidation is used once but not kept
+        self._epoch = 0
+
+    async def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+            return snapshot
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+                return snapshot
+            epoch = self._epoch
+            snapshot = CatalogSnapshot(await payment_repo.list_active_accounts(), await coach_repo.list_all())
+            self.loads += 1
+            if epoch == self._epoch:
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        self._epoch += 1
+        self._snapshot = None
+
+    async def account(self, country):
+        return (await self.snapshot()).accounts_by_country.get(country)
+
+    async def coaches(self):
+        return (await self.snapshot()).coaches
+
+    async def coach(self, coach_id):
+        return (await self.snapshot()).coaches_by_id.get(coach_id)
+
+    async def coach_name(self, coach_id, default="None"):
+        coach = await self.coach(coach_id) if coach_id else None
+        return coach.name if coach else default
+
+catalog = Catalog(ttl=CATALOG_TTL)
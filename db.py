@@ -0,0 +1,68 @@
+import logging
+from contextlib import asynccontextmanager
+
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Shared async connection pool, opened from Application.post_init so it lives on the bot's event loop
+pool = None
+
+async def open_pool(conninfo, min_size=2, max_size=10, timeout=30.0):
+    global pool
+    pool = AsyncConnectionPool(conninfo, min_size=min_size, max_size=max_size, timeout=timeout, open=False)
+    await pool.open(wait=True)
+    logger.info(f"Database pool opened (min_size={min_size}, max_size={max_size})")
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+        logger.info("Database pool closed")
+
+# Checks a connection out for the duration of the block; commits on success, rolls back on error
+@asynccontextmanager
+async def connection():
+    async with pool.connection() as conn:
+        yield conn
+
+# Runs every statement issued on the yielded cursor inside one transaction
+@asynccontextmanager
+async def transaction(row_factory=None):
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with _cursor(conn, row_factory) as cur:
+                yield cur
+
+def _cursor(conn, row_factory):
+    return conn.cursor(row_factory=row_factory) if row_factory else conn.cursor()
+
+# prepare=True asks psycopg to use a server-side prepared statement on the checked-out connection
+async def fetchone(query, params=None, prepare=None, row_factory=None):
+    async with pool.connection() as conn:
+        async with _cursor(conn, row_factory) as cur:
+            await cur.execute(query, params, prepare=prepare)
+            return await cur.fetchone()
+
+async def fetchall(query, params=None, prepare=None, row_factory=None):
+    async with pool.connection() as conn:
+        async with _cursor(conn, row_factory) as cur:
+            await cur.execute(query, params, prepare=prepare)
+            return await cur.fetchall()
+
+async def execute(query, params=None, prepare=None):
+    async with pool.connection() as conn:
+        cur = await conn.execute(query, params, prepare=prepare)
+        return cur.rowcount
+
+# Yields a server-side cursor so large results are read `size` rows per round trip instead of all at once
+@asynccontextmanager
+async def stream(query, params=None, row_factory=None, size=500):
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            cursor = conn.cursor("stream", row_factory=row_factory) if row_factory else conn.cursor("stream")
+            async with cursor as cur:
+                cur.itersize = size
+                await cur.execute(query, params)
+                yield cur
@@ -0,0 +1,73 @@
+import datetime
+import gzip
+import os
+import tempfile
+
+from psycopg import sql
+
+import db
+
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", 50 * 1024 * 1024))  # Telegram's upload limit for bots
+
+# Table name -> (query, timestamp column the date range filters on). Columns are listed
+# explicitly so secrets such as users.password never leave the database.
+EXPORT_TABLES = {
+    "users": (
+        "SELECT chat_id, username, name, email, phone, payment_status, package, selected_coach, referral_code, "
+        "referred_by, invites, streaks, alarm_setting, balance_cents, join_date, screenshot_uploaded_at, approved_at, "
+        "registration_date FROM users",
+        "join_date",
+    ),
+    "payments": (
+        "SELECT id, chat_id, type, package, quantity, total_amount, payment_account, status, timestamp, approved_at FROM payments",
+        "timestamp",
+    ),
+    # Coupons have no timestamp of their own; they are dated by the payment they were issued for
+    "coupons": (
+        "SELECT c.id, c.payment_id, p.chat_id, p.package, c.code, p.timestamp AS paid_at "
+        "FROM coupons c JOIN payments p ON p.id = c.payment_id",
+        "p.timestamp",
+    ),
+    "interactions": ("SELECT id, chat_id, action, timestamp FROM interactions", "timestamp"),
+    "user_tasks": ("SELECT user_id, task_id, completed_at FROM user_tasks", "completed_at"),
+}
+
+# Result of export_table: a gzipped CSV in a temporary file, rewound and ready to upload
+class Export:
+    def __init__(self, file, filename, rows, size):
+        self.file = file
+        self.filename = filename
+        self.rows = rows
+        self.size = size
+
+# Streams the table through COPY ... TO STDOUT straight into a gzip temp file, so memory use stays at one
+# COPY chunk however large the table is. `until` is inclusive; either bound may be None.
+async def export_table(table, since=None, until=None):
+    query, date_column = EXPORT_TABLES[table]
+    conditions, params = [], []
+    if since:
+        conditions.append(f"{date_column} >= %s")
+        params.append(since)
+    if until:
+        conditions.append(f"{date_column} < %s")
+        params.append(until + datetime.timedelta(days=1))
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    statement = sql.SQL("COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query=sql.SQL(query))
+
+    file = tempfile.TemporaryFile()
+    try:
+        with gzip.GzipFile(fileobj=file, mode="wb") as compressed:
+            async with db.connection() as conn:
+                async with conn.cursor() as cur:
+                    async with cur.copy(statement, params) as copy:
+                        async for chunk in copy:
+                            compressed.write(chunk)
+                    rows = cur.rowcount
+        size = file.tell()
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+    period = f"_{since or 'start'}_{until or 'now'}" if since or until else ""
+    return Export(file, f"{table}{period}.csv.gz", rows, size)
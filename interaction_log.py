@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import logging
+import os
+from collections import Counter, deque
+
+import psycopg
+
+import db
+
+INTERACTION_QUEUE_SIZE = int(os.getenv("INTERACTION_QUEUE_SIZE", 50000))
+INTERACTION_BATCH_SIZE = int(os.getenv("INTERACTION_BATCH_SIZE", 500))
+INTERACTION_FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", 2))
+# "drop" discards the oldest queued event when full, "block" makes callers wait for the next flush
+INTERACTION_OVERFLOW = os.getenv("INTERACTION_OVERFLOW", "drop")
+
+logger = logging.getLogger(__name__)
+
+# Buffers interaction events in memory and writes them with COPY on size/time thresholds
+class InteractionWriter:
+    COPY = "COPY interactions (chat_id, action, timestamp) FROM STDIN"
+    ROLLUP = (
+        "INSERT INTO interaction_rollups (bucket, interactions) VALUES (%s, %s) "
+        "ON CONFLICT (bucket) DO UPDATE SET interactions = interaction_rollups.interactions + EXCLUDED.interactions"
+    )
+    BUMP_COUNTER = "SELECT bump_stat_counter(%s, %s)"
+
+    def __init__(self, max_queue=50000, batch_size=500, flush_interval=2.0, overflow="drop"):
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def log(self, chat_id, action):
+        if len(self._queue) >= self.max_queue:
+            if self.overflow == "block" and self._task is not None:
+                # Re-arm on every pass: a flush that freed too little leaves the event set, and waiting on it would spin
+                while len(self._queue) >= self.max_queue:
+                    self._space.clear()
+                    self._wakeup.set()
+                    await self._space.wait()
+            else:
+                self._queue.popleft()
+                self.dropped += 1
+        self._queue.append((chat_id, action, datetime.datetime.now()))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    # Lets an in-progress COPY finish instead of cancelling it, then drains what is left
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._queue:
+            logger.warning(f"Interaction writer stopped with {len(self._queue)} unwritten events")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                try:
+                    async with db.connection() as conn:
+                        async with conn.cursor() as cur:
+                            async with cur.copy(self.COPY) as copy:
+                                for row in batch:
+                                    await copy.write_row(row)
+                            # Rollups commit with the rows they count, so a requeued batch is never counted twice
+                            buckets = Counter(timestamp.replace(second=0, microsecond=0) for _, _, timestamp in batch)
+                            await cur.executemany(self.ROLLUP, sorted(buckets.items()))
+                            starts = sum(1 for _, action, _ in batch if action == "start")
+                            if starts:
+                                await cur.execute(self.BUMP_COUNTER, ("start_clicks", starts))
+                except psycopg.Error as e:
+                    self.failed_flushes += 1
+                    logger.error(f"Database error flushing {len(batch)} interactions: {e}")
+                    # Put the batch back for the next tick, keeping the newest events if that overflows the queue
+                    self._queue.extendleft(reversed(batch))
+                    while len(self._queue) > self.max_queue:
+                        self._queue.popleft()
+                        self.dropped += 1
+                    break
+                self.written += len(batch)
+                self._space.set()
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+interaction_writer = InteractionWriter(
+    max_queue=INTERACTION_QUEUE_SIZE,
+    batch_size=INTERACTION_BATCH_SIZE,
+    flush_interval=INTERACTION_FLUSH_INTERVAL,
+    overflow=INTERACTION_OVERFLOW,
+)
@@ -0,0 +1,79 @@
+import datetime
+import logging
+import os
+
+from psycopg import sql
+
+import db
+
+INTERACTIONS_RETENTION_DAYS = int(os.getenv("INTERACTIONS_RETENTION_DAYS", 30))
+INTERACTIONS_PREMAKE_DAYS = int(os.getenv("INTERACTIONS_PREMAKE_DAYS", 7))
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "interactions_p"
+
+# Keeps daily interactions partitions created ahead of time, and rolls days past the retention
+# window up into interaction_daily_rollups before dropping their raw rows
+class InteractionRetention:
+    LIST_PARTITIONS = """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'interactions'::regclass ORDER BY c.relname
+    """
+    ENSURE_PARTITIONS = "SELECT ensure_interaction_partitions(CURRENT_DATE, CURRENT_DATE + %s)"
+    ROLLUP = """
+        INSERT INTO interaction_daily_rollups (day, action, interactions)
+        SELECT timestamp::DATE, COALESCE(action, ''), COUNT(*) FROM {table} WHERE timestamp < %s GROUP BY 1, 2
+        ON CONFLICT (day, action) DO UPDATE SET interactions = interaction_daily_rollups.interactions + EXCLUDED.interactions
+    """
+    # Every worker prunes at startup and nightly; each step takes this lock and re-checks its partition, so
+    # two workers never roll up the same rows twice
+    PRUNE_LOCK_ID = 715003
+    LOCK = "SELECT pg_advisory_xact_lock(%s)"
+    EXISTS = "SELECT to_regclass(%s) IS NOT NULL"
+    DELETE_DEFAULT = "DELETE FROM interactions_default WHERE timestamp < %s"
+    PRUNE_MINUTE_ROLLUPS = "DELETE FROM interaction_rollups WHERE bucket < %s"
+
+    def __init__(self, retention_days=30, premake_days=7):
+        self.retention_days = retention_days
+        self.premake_days = premake_days
+
+    async def ensure_partitions(self):
+        row = await db.fetchone(self.ENSURE_PARTITIONS, (self.premake_days,))
+        return row[0]
+
+    # Each partition is rolled up and dropped in its own transaction, so a failure part-way keeps earlier progress
+    async def prune(self):
+        cutoff = datetime.date.today() - datetime.timedelta(days=self.retention_days)
+        cutoff_ts = datetime.datetime.combine(cutoff, datetime.time())
+        dropped = 0
+        for (name,) in await db.fetchall(self.LIST_PARTITIONS):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            day = datetime.datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+            if day >= cutoff:
+                continue
+            async with db.transaction() as cursor:
+                await cursor.execute(self.LOCK, (self.PRUNE_LOCK_ID,))
+                await cursor.execute(self.EXISTS, (name,))
+                if not (await cursor.fetchone())[0]:
+                    continue
+                await cursor.execute(sql.SQL(self.ROLLUP).format(table=sql.Identifier(name)), (cutoff_ts,))
+                await cursor.execute(sql.SQL("DROP TABLE {table}").format(table=sql.Identifier(name)))
+            dropped += 1
+        async with db.transaction() as cursor:
+            await cursor.execute(self.LOCK, (self.PRUNE_LOCK_ID,))
+            await cursor.execute(sql.SQL(self.ROLLUP).format(table=sql.Identifier("interactions_default")), (cutoff_ts,))
+            await cursor.execute(self.DELETE_DEFAULT, (cutoff_ts,))
+            await cursor.execute(self.PRUNE_MINUTE_ROLLUPS, (cutoff_ts,))
+        return dropped
+
+    async def run(self):
+        created = await self.ensure_partitions()
+        dropped = await self.prune()
+        return {"created": created, "dropped": dropped}
+
+interaction_retention = InteractionRetention(
+    retention_days=INTERACTIONS_RETENTION_DAYS,
+    premake_days=INTERACTIONS_PREMAKE_DAYS,
+)
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+
+import db
+
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", 100))
+JOB_LEASE = int(os.getenv("JOB_LEASE", 300))  # seconds a claimed job stays hidden; a crashed worker's jobs fire again after this
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", 60))
+
+logger = logging.getLogger(__name__)
+
+# One-off delayed jobs kept in scheduled_jobs, so they survive restarts and are shared by every
+# worker process. Handlers are registered by name and called as handler(bot, data).
+class JobStore:
+    SCHEDULE = "INSERT INTO scheduled_jobs (name, data, run_at) VALUES (%s, %s, %s) RETURNING id"
+    # Claiming pushes run_at out by the lease instead of holding a transaction open while handlers
+    # run; SKIP LOCKED lets several workers claim disjoint batches from the same table
+    CLAIM = """
+    UPDATE scheduled_jobs SET run_at = %(lease_until)s, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM scheduled_jobs WHERE run_at <= %(now)s
+        ORDER BY run_at LIMIT %(limit)s FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, name, data, attempts
+    """
+    DELETE = "DELETE FROM scheduled_jobs WHERE id = ANY(%s)"
+    RETRY = "UPDATE scheduled_jobs SET run_at=%s, last_error=%s WHERE id=%s"
+    PENDING = "SELECT COUNT(*) FROM scheduled_jobs"
+
+    def __init__(self, poll_interval=5, batch_size=100, lease=300, max_attempts=3, retry_delay=60):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bot = None
+        self.fired = 0
+        self.failed = 0
+        self.handlers = {}
+        self._task = None
+
+    def register(self, name, handler):
+        self.handlers[name] = handler
+
+    async def schedule(self, name, data, delay):
+        if name not in self.handlers:
+            raise ValueError(f"Unknown job: {name}")
+        run_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+        row = await db.fetchone(self.SCHEDULE, (name, json.dumps(data), run_at), prepare=True)
+        return row[0]
+
+    def start(self, bot):
+        self.bot = bot
+        self._task = asyncio.create_task(self._poll())
+
+    # Jobs claimed by an interrupted batch keep their pushed-out run_at and fire again once the lease passes
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            try:
+                claimed = await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job store poll failed: {e}")
+                claimed = 0
+            # A full batch means more are probably due, so go again without sleeping
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    # Claims and runs one batch of due jobs; returns how many were claimed
+    async def run_due(self, now=None):
+        now = now or datetime.datetime.now()
+        jobs = await db.fetchall(self.CLAIM, {
+            "now": now,
+            "lease_until": now + datetime.timedelta(seconds=self.lease),
+            "limit": self.batch_size,
+        }, prepare=True)
+        if not jobs:
+            return 0
+        results = await asyncio.gather(*(self._run(name, data) for _, name, data, _ in jobs), return_exceptions=True)
+        done = []
+        for (job_id, name, _, attempts), error in zip(jobs, results):
+            if error is None:
+                self.fired += 1
+                done.append(job_id)
+                continue
+            self.failed += 1
+            if attempts >= self.max_attempts or name not in self.handlers:
+                logger.error(f"Job #{job_id} ({name}) failed for good after {attempts} attempts: {error}")
+                done.append(job_id)
+            else:
+                logger.warning(f"Job #{job_id} ({name}) failed, retrying: {error}")
+                retry_at = datetime.datetime.now() + datetime.timedelta(seconds=self.retry_delay * attempts)
+                await db.execute(self.RETRY, (retry_at, str(error), job_id))
+        if done:
+            await db.execute(self.DELETE, (done,))
+        return len(jobs)
+
+    async def _run(self, name, data):
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise LookupError(f"no handler registered for {name}")
+        await handler(self.bot, data)
+
+    async def pending(self):
+        row = await db.fetchone(self.PENDING)
+        return row[0]
+
+    def stats(self):
+        return {"fired": self.fired, "failed": self.failed}
+
+job_store = JobStore(
+    poll_interval=JOB_POLL_INTERVAL,
+    batch_size=JOB_BATCH_SIZE,
+    lease=JOB_LEASE,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retry_delay=JOB_RETRY_DELAY,
+)
@@ -0,0 +1,142 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+
+from psycopg.rows import namedtuple_row
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import db
+from exports import Export
+
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", 25))
+MAX_MESSAGE_LENGTH = 4096
+
+NEXT = "n"
+PREV = "p"
+
+# A keyset-paginated admin listing. Pages are "rows after/before this key", so every page is an
+# index range scan however deep the admin pages, and the cursor travels in the button's callback data
+# as page_<name>_<n|p>_<key>. A scope_filter narrows the rows with %(scope)s (e.g. a coach's own users).
+class Listing:
+    def __init__(self, name, title, empty_text, table, columns, key, format_row, where=None, scope_filter=None, page_size=25):
+        self.name = name
+        self.title = title
+        self.empty_text = empty_text
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.format_row = format_row
+        self.where = where
+        self.scope_filter = scope_filter
+        self.page_size = page_size
+
+    def _query(self, direction=NEXT, cursor=None, scoped=False, limited=True):
+        conditions = [self.where] if self.where else []
+        if scoped:
+            conditions.append(self.scope_filter)
+        if cursor is not None:
+            conditions.append(f"{self.key} {'>' if direction == NEXT else '<'} %(cursor)s")
+        query = f"SELECT {self.columns} FROM {self.table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {self.key} {'ASC' if direction == NEXT else 'DESC'}"
+        if limited:
+            query += " LIMIT %(limit)s"
+        return query
+
+    # Returns (text, reply_markup) for the page after (NEXT) or before (PREV) the cursor key
+    async def page(self, direction=NEXT, cursor=None, scope=None):
+        rows = await db.fetchall(
+            self._query(direction, cursor, scoped=scope is not None),
+            {"cursor": cursor, "scope": scope, "limit": self.page_size + 1},
+            row_factory=namedtuple_row,
+        )
+        if not rows:
+            # The rows behind a stale button were deleted; start over rather than show an empty page
+            return await self.page(scope=scope) if cursor is not None else (self.empty_text, None)
+        more = len(rows) > self.page_size
+        # Rows arrive nearest-to-cursor first in both directions, so the message is trimmed from the far end
+        length = len(self.title) + 2
+        lines = []
+        for row in rows[:self.page_size]:
+            line = self.format_row(row)
+            if lines and length + len(line) + 1 > MAX_MESSAGE_LENGTH:
+                more = True
+                break
+            line = line[:MAX_MESSAGE_LENGTH - length - 1]
+            lines.append((getattr(row, self.key), line))
+            length += len(line) + 1
+        if direction == PREV:
+            lines.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = cursor is not None, more
+        text = f"{self.title}:\n\n" + "\n".join(line for _, line in lines)
+        return text, self._keyboard(lines[0][0], lines[-1][0], has_prev, has_next)
+
+    def _keyboard(self, first_key, last_key, has_prev, has_next):
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page_{self.name}_{PREV}_{first_key}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{self.name}_{NEXT}_{last_key}"))
+        keyboard = [navigation] if navigation else []
+        keyboard.append([InlineKeyboardButton("📄 Export CSV", callback_data=f"csv_{self.name}")])
+        return InlineKeyboardMarkup(keyboard)
+
+    # Streams every row through a server-side cursor into a gzipped CSV temp file, as exports.export_table does,
+    # so neither the rows nor the file are held in memory
+    async def export_csv(self, scope=None):
+        file = tempfile.TemporaryFile()
+        rows = 0
+        try:
+            with gzip.GzipFile(fileobj=file, mode="wb") as compressed:
+                text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                async with db.stream(self._query(scoped=scope is not None, limited=False), {"scope": scope}) as cur:
+                    writer.writerow([column.name for column in cur.description])
+                    async for row in cur:
+                        writer.writerow(row)
+                        rows += 1
+                text.flush()
+                text.detach()
+            size = file.tell()
+            file.seek(0)
+        except BaseException:
+            file.close()
+            raise
+        return Export(file, f"{self.name}.csv.gz", rows, size)
+
+def _format_user(user):
+    return f"Chat ID: {user.chat_id}, Username: @{user.username or 'Unknown'}, Package: {user.package}, Registered: {user.registration_date}"
+
+def _format_account(account):
+    status = "Active" if account.is_active else "Inactive"
+    return f"Country: {account.country} {account.flag}, Details: {account.details}, Status: {status}"
+
+USER_COLUMNS = "chat_id, username, package, registration_date"
+
+LISTINGS = {listing.name: listing for listing in (
+    Listing(
+        "registered", "Registered Users", "No registered users found.",
+        "users", USER_COLUMNS, "chat_id", _format_user,
+        where="payment_status = 'registered'", page_size=LISTING_PAGE_SIZE,
+    ),
+    Listing(
+        "myusers", "Your Registered Users", "You have no registered users.",
+        "users", USER_COLUMNS, "chat_id", _format_user,
+        where="payment_status = 'registered'", scope_filter="selected_coach = %(scope)s", page_size=LISTING_PAGE_SIZE,
+    ),
+    Listing(
+        "coaches", "List of Coaches", "No coaches found.",
+        "coaches", "coach_id, name", "coach_id", lambda coach: f"Coach ID: {coach.coach_id}, Name: {coach.name}",
+        page_size=LISTING_PAGE_SIZE,
+    ),
+    Listing(
+        "accounts", "Payment Accounts", "No payment accounts found.",
+        "payment_accounts", "id, country, flag, details, is_active", "id", _format_account,
+        page_size=LISTING_PAGE_SIZE,
+    ),
+)}
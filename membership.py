@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+from cache import TTLCache
+
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 300))
+MEMBERSHIP_COOLDOWN = float(os.getenv("MEMBERSHIP_COOLDOWN", 15))  # how long a "not a member" answer is reused
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 20000))
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+# Answers "is user_id in chat?" with at most one get_chat_member call per (chat, user) in flight,
+# caching joins for MEMBERSHIP_CACHE_TTL and non-joins for the shorter cooldown
+class MembershipChecker:
+    def __init__(self, ttl=300, cooldown=15, maxsize=20000):
+        self.members = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.non_members = TTLCache(maxsize=maxsize, ttl=cooldown)
+        self.api_calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def is_member(self, bot, chat, user_id):
+        key = (chat, user_id)
+        if self.members.get(key):
+            return True
+        if self.non_members.get(key):
+            return False
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(bot, chat, user_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled tap doesn't cancel the lookup the others are waiting on
+        return await asyncio.shield(task)
+
+    # Errors are not cached; every waiter sees the exception and the next tap retries
+    async def _fetch(self, bot, chat, user_id):
+        self.api_calls += 1
+        member = await bot.get_chat_member(chat, user_id)
+        if member.status in MEMBER_STATUSES:
+            self.members.set((chat, user_id), True)
+            return True
+        self.non_members.set((chat, user_id), True)
+        return False
+
+    def stats(self):
+        return {
+            "api_calls": self.api_calls,
+            "coalesced": self.coalesced,
+            "members": self.members.stats(),
+            "non_members": self.non_members.stats(),
+        }
+
+membership = MembershipChecker(ttl=MEMBERSHIP_CACHE_TTL, cooldown=MEMBERSHIP_COOLDOWN, maxsize=MEMBERSHIP_CACHE_SIZE)
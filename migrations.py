@@ -0,0 +1,529 @@
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock so only one worker applies migrations at a time
+MIGRATION_LOCK_ID = 715_001
+
+# (version, name, statements). Append new migrations; never edit one that has shipped.
+# The first two use IF NOT EXISTS so databases created by the old inline bootstrap adopt them as-is.
+MIGRATIONS = [
+    (1, "initial_schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            chat_id BIGINT PRIMARY KEY,
+            package TEXT,
+            payment_status TEXT DEFAULT 'new',
+            name TEXT,
+            username TEXT,
+            email TEXT,
+            phone TEXT,
+            password TEXT,
+            join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            alarm_setting INTEGER DEFAULT 0,
+            streaks INTEGER DEFAULT 0,
+            invites INTEGER DEFAULT 0,
+            balance REAL DEFAULT 0,
+            screenshot_uploaded_at TIMESTAMP,
+            approved_at TIMESTAMP,
+            registration_date TIMESTAMP,
+            referral_code TEXT,
+            referred_by BIGINT,
+            selected_coach BIGINT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+            id SERIAL PRIMARY KEY,
+            chat_id BIGINT,
+            type TEXT,
+            package TEXT,
+            quantity INTEGER,
+            total_amount INTEGER,
+            payment_account TEXT,
+            status TEXT DEFAULT 'pending_payment',
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            approved_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS coupons (
+            id SERIAL PRIMARY KEY,
+            payment_id INTEGER,
+            code TEXT,
+            FOREIGN KEY (payment_id) REFERENCES payments(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS interactions (
+            id SERIAL PRIMARY KEY,
+            chat_id BIGINT,
+            action TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id SERIAL PRIMARY KEY,
+            type TEXT,
+            link TEXT,
+            reward REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_tasks (
+            user_id BIGINT,
+            task_id INTEGER,
+            completed_at TIMESTAMP,
+            PRIMARY KEY (user_id, task_id),
+            FOREIGN KEY (user_id) REFERENCES users(chat_id),
+            FOREIGN KEY (task_id) REFERENCES tasks(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS coaches (
+            coach_id BIGINT PRIMARY KEY,
+            name TEXT,
+            added_by BIGINT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS payment_accounts (
+            id SERIAL PRIMARY KEY,
+            country TEXT,
+            flag TEXT,
+            details TEXT,
+            is_active INTEGER DEFAULT 1
+        )
+        """,
+    ]),
+    (2, "broadcasts_and_user_states", [
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id SERIAL PRIMARY KEY,
+            audience TEXT NOT NULL,
+            message TEXT NOT NULL,
+            log_action TEXT,
+            created_by BIGINT,
+            status TEXT DEFAULT 'running',
+            last_chat_id BIGINT,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_states (
+            chat_id BIGINT PRIMARY KEY,
+            state JSONB NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+        """,
+    ]),
+    (3, "hot_path_indexes", [
+        # (payment_status, chat_id) also serves the keyset walk over registered users in broadcasts
+        "CREATE INDEX IF NOT EXISTS idx_users_payment_status ON users (payment_status, chat_id)",
+        # Only subscribers are ever looked up, so a partial index stays small
+        "CREATE INDEX IF NOT EXISTS idx_users_alarm_on ON users (chat_id) WHERE alarm_setting = 1",
+        "CREATE INDEX IF NOT EXISTS idx_users_selected_coach ON users (selected_coach)",
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)",
+        "CREATE INDEX IF NOT EXISTS idx_users_registration_date ON users (registration_date)",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_action ON interactions (action)",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp)",
+        # Equality column first so "status='approved' AND approved_at >= ..." is a single range scan
+        "CREATE INDEX IF NOT EXISTS idx_payments_status_approved_at ON payments (status, approved_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_tasks_completed_at ON user_tasks (completed_at)",
+    ]),
+    (4, "stat_counters_and_interaction_rollups", [
+        """
+        CREATE TABLE stat_counters (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE interaction_rollups (
+            bucket TIMESTAMP PRIMARY KEY,
+            interactions INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE FUNCTION bump_stat_counter(counter TEXT, delta BIGINT) RETURNS void AS $$
+            INSERT INTO stat_counters (name, value) VALUES (counter, delta)
+            ON CONFLICT (name) DO UPDATE SET value = stat_counters.value + EXCLUDED.value
+        $$ LANGUAGE sql
+        """,
+        # users is written from many places (start, package selection, admin approval), so the
+        # counters follow row changes in a trigger instead of being bumped by each caller
+        """
+        CREATE FUNCTION users_stat_counters() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM bump_stat_counter('users_total', 1);
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM bump_stat_counter('users_total', -1);
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_status = 'registered' THEN
+                PERFORM bump_stat_counter('users_registered', -1);
+                PERFORM bump_stat_counter('registered_package:' || COALESCE(OLD.package, ''), -1);
+                PERFORM bump_stat_counter('registered_coach:' || COALESCE(OLD.selected_coach::TEXT, ''), -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_status = 'registered' THEN
+                PERFORM bump_stat_counter('users_registered', 1);
+                PERFORM bump_stat_counter('registered_package:' || COALESCE(NEW.package, ''), 1);
+                PERFORM bump_stat_counter('registered_coach:' || COALESCE(NEW.selected_coach::TEXT, ''), 1);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER users_stat_counters_insert_delete AFTER INSERT OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION users_stat_counters()
+        """,
+        """
+        CREATE TRIGGER users_stat_counters_update AFTER UPDATE OF payment_status, package, selected_coach ON users
+        FOR EACH ROW WHEN (
+            OLD.payment_status IS DISTINCT FROM NEW.payment_status
+            OR OLD.package IS DISTINCT FROM NEW.package
+            OR OLD.selected_coach IS DISTINCT FROM NEW.selected_coach
+        )
+        EXECUTE FUNCTION users_stat_counters()
+        """,
+        # Seed from the existing rows; the rollups only need to cover the 24-hour /botstats window
+        "INSERT INTO stat_counters (name, value) SELECT 'users_total', COUNT(*) FROM users",
+        "INSERT INTO stat_counters (name, value) SELECT 'users_registered', COUNT(*) FROM users WHERE payment_status = 'registered'",
+        """
+        INSERT INTO stat_counters (name, value)
+        SELECT 'registered_package:' || COALESCE(package, ''), COUNT(*) FROM users
+        WHERE payment_status = 'registered' GROUP BY 1
+        """,
+        """
+        INSERT INTO stat_counters (name, value)
+        SELECT 'registered_coach:' || COALESCE(selected_coach::TEXT, ''), COUNT(*) FROM users
+        WHERE payment_status = 'registered' GROUP BY 1
+        """,
+        "INSERT INTO stat_counters (name, value) SELECT 'start_clicks', COUNT(*) FROM interactions WHERE action = 'start'",
+        """
+        INSERT INTO interaction_rollups (bucket, interactions)
+        SELECT date_trunc('minute', timestamp), COUNT(*) FROM interactions
+        WHERE timestamp >= NOW() - INTERVAL '2 days' GROUP BY 1
+        """,
+    ]),
+    (5, "partition_interactions_by_day", [
+        "ALTER TABLE interactions RENAME TO interactions_legacy",
+        "DROP INDEX IF EXISTS idx_interactions_action",
+        "DROP INDEX IF EXISTS idx_interactions_timestamp",
+        """
+        CREATE TABLE interactions (
+            id BIGSERIAL,
+            chat_id BIGINT,
+            action TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (timestamp)
+        """,
+        "CREATE INDEX idx_interactions_action ON interactions (action)",
+        "CREATE INDEX idx_interactions_timestamp ON interactions (timestamp)",
+        # Catches rows for days whose partition doesn't exist yet; ensure_interaction_partitions moves them out
+        "CREATE TABLE interactions_default PARTITION OF interactions DEFAULT",
+        """
+        CREATE TABLE interaction_daily_rollups (
+            day DATE NOT NULL,
+            action TEXT NOT NULL,
+            interactions BIGINT NOT NULL,
+            PRIMARY KEY (day, action)
+        )
+        """,
+        """
+        CREATE FUNCTION ensure_interaction_partitions(first_day DATE, last_day DATE) RETURNS INTEGER AS $$
+        DECLARE
+            d DATE := first_day;
+            part_name TEXT;
+            created INTEGER := 0;
+        BEGIN
+            WHILE d <= last_day LOOP
+                part_name := 'interactions_p' || to_char(d, 'YYYYMMDD');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE interactions INCLUDING DEFAULTS)', part_name);
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM interactions_default WHERE timestamp >= %L AND timestamp < %L '
+                        'RETURNING id, chat_id, action, timestamp) '
+                        'INSERT INTO %I (id, chat_id, action, timestamp) SELECT * FROM moved',
+                        d, d + 1, part_name
+                    );
+                    EXECUTE format('ALTER TABLE interactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part_name, d, d + 1);
+                    created := created + 1;
+                END IF;
+                d := d + 1;
+            END LOOP;
+            RETURN created;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        SELECT ensure_interaction_partitions(
+            COALESCE((SELECT MIN(timestamp)::DATE FROM interactions_legacy), CURRENT_DATE),
+            CURRENT_DATE + 7
+        )
+        """,
+        """
+        INSERT INTO interactions (chat_id, action, timestamp)
+        SELECT chat_id, action, COALESCE(timestamp, CURRENT_TIMESTAMP) FROM interactions_legacy
+        """,
+        "DROP TABLE interactions_legacy",
+    ]),
+    (6, "balance_ledger", [
+        "ALTER TABLE users ADD COLUMN balance_cents BIGINT NOT NULL DEFAULT 0",
+        "UPDATE users SET balance_cents = round(COALESCE(balance, 0) * 100)",
+        """
+        CREATE TABLE balance_ledger (
+            id BIGSERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL REFERENCES users(chat_id),
+            amount_cents BIGINT NOT NULL,
+            reason TEXT NOT NULL,
+            ref TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX idx_balance_ledger_chat_id ON balance_ledger (chat_id, id)",
+        # Existing balances become one opening entry each, so the ledger sums to balance_cents from the start
+        """
+        INSERT INTO balance_ledger (chat_id, amount_cents, reason)
+        SELECT chat_id, balance_cents, 'opening_balance' FROM users WHERE balance_cents <> 0
+        """,
+        "ALTER TABLE users DROP COLUMN balance",
+        # Appends an entry and moves the materialized balance in the same statement; unknown
+        # accounts (e.g. a referral link with a bad id) post nothing and return NULL
+        """
+        CREATE FUNCTION post_balance_entry(account BIGINT, delta BIGINT, entry_reason TEXT, entry_ref TEXT) RETURNS BIGINT AS $$
+            WITH credited AS (
+                UPDATE users SET balance_cents = balance_cents + delta WHERE chat_id = account
+                RETURNING chat_id, balance_cents
+            ), entry AS (
+                INSERT INTO balance_ledger (chat_id, amount_cents, reason, ref)
+                SELECT chat_id, delta, entry_reason, entry_ref FROM credited
+            )
+            SELECT balance_cents FROM credited
+        $$ LANGUAGE sql
+        """,
+    ]),
+    (7, "scheduled_jobs", [
+        """
+        CREATE TABLE scheduled_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            data JSONB NOT NULL DEFAULT '{}',
+            run_at TIMESTAMP NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX idx_scheduled_jobs_run_at ON scheduled_jobs (run_at)",
+    ]),
+    (8, "coach_listing_index", [
+        # Keyset pages of /my_users walk (selected_coach, chat_id) for registered users only
+        "CREATE INDEX idx_users_coach_registered ON users (selected_coach, chat_id) WHERE payment_status = 'registered'",
+    ]),
+    (9, "daily_rollups", [
+        """
+        CREATE TABLE package_prices (
+            package TEXT PRIMARY KEY,
+            price INTEGER NOT NULL
+        )
+        """,
+        "INSERT INTO package_prices (package, price) VALUES ('Standard', 9000), ('X', 14000)",
+        """
+        CREATE TABLE daily_rollups (
+            day DATE PRIMARY KEY,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            registration_revenue BIGINT NOT NULL DEFAULT 0,
+            coupon_revenue BIGINT NOT NULL DEFAULT 0,
+            tasks_completed INTEGER NOT NULL DEFAULT 0,
+            rewards_cents BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE FUNCTION bump_daily_rollup(
+            rollup_day DATE, users_delta INTEGER, registration_delta BIGINT,
+            coupon_delta BIGINT, tasks_delta INTEGER, rewards_delta BIGINT
+        ) RETURNS void AS $$
+            INSERT INTO daily_rollups (day, new_users, registration_revenue, coupon_revenue, tasks_completed, rewards_cents)
+            VALUES (rollup_day, users_delta, registration_delta, coupon_delta, tasks_delta, rewards_delta)
+            ON CONFLICT (day) DO UPDATE SET
+                new_users = daily_rollups.new_users + EXCLUDED.new_users,
+                registration_revenue = daily_rollups.registration_revenue + EXCLUDED.registration_revenue,
+                coupon_revenue = daily_rollups.coupon_revenue + EXCLUDED.coupon_revenue,
+                tasks_completed = daily_rollups.tasks_completed + EXCLUDED.tasks_completed,
+                rewards_cents = daily_rollups.rewards_cents + EXCLUDED.rewards_cents
+        $$ LANGUAGE sql
+        """,
+        # A registration counts on its registration day, with the package price as revenue;
+        # leaving 'registered' takes it back off the same day
+        """
+        CREATE FUNCTION users_daily_rollup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.payment_status = 'registered' THEN
+                PERFORM bump_daily_rollup(
+                    COALESCE(OLD.registration_date, CURRENT_TIMESTAMP)::DATE, -1,
+                    -COALESCE((SELECT price FROM package_prices WHERE package = OLD.package), 0), 0, 0, 0
+                );
+            END IF;
+            IF NEW.payment_status = 'registered' THEN
+                PERFORM bump_daily_rollup(
+                    COALESCE(NEW.registration_date, CURRENT_TIMESTAMP)::DATE, 1,
+                    COALESCE((SELECT price FROM package_prices WHERE package = NEW.package), 0), 0, 0, 0
+                );
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER users_daily_rollup_insert AFTER INSERT ON users
+        FOR EACH ROW WHEN (NEW.payment_status = 'registered') EXECUTE FUNCTION users_daily_rollup()
+        """,
+        """
+        CREATE TRIGGER users_daily_rollup_update AFTER UPDATE OF payment_status, package ON users
+        FOR EACH ROW WHEN (
+            (OLD.payment_status = 'registered' OR NEW.payment_status = 'registered')
+            AND (OLD.payment_status IS DISTINCT FROM NEW.payment_status OR OLD.package IS DISTINCT FROM NEW.package)
+        )
+        EXECUTE FUNCTION users_daily_rollup()
+        """,
+        """
+        CREATE FUNCTION payments_daily_rollup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.status = 'approved' THEN
+                PERFORM bump_daily_rollup(COALESCE(OLD.approved_at, CURRENT_TIMESTAMP)::DATE, 0, 0, -COALESCE(OLD.total_amount, 0), 0, 0);
+            END IF;
+            IF NEW.status = 'approved' THEN
+                PERFORM bump_daily_rollup(COALESCE(NEW.approved_at, CURRENT_TIMESTAMP)::DATE, 0, 0, COALESCE(NEW.total_amount, 0), 0, 0);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER payments_daily_rollup_insert AFTER INSERT ON payments
+        FOR EACH ROW WHEN (NEW.status = 'approved') EXECUTE FUNCTION payments_daily_rollup()
+        """,
+        """
+        CREATE TRIGGER payments_daily_rollup_update AFTER UPDATE OF status, total_amount, approved_at ON payments
+        FOR EACH ROW WHEN (
+            (OLD.status = 'approved' OR NEW.status = 'approved')
+            AND (OLD.status IS DISTINCT FROM NEW.status OR OLD.total_amount IS DISTINCT FROM NEW.total_amount
+                 OR OLD.approved_at IS DISTINCT FROM NEW.approved_at)
+        )
+        EXECUTE FUNCTION payments_daily_rollup()
+        """,
+        # A revoked task is taken back off the day it was completed
+        """
+        CREATE FUNCTION user_tasks_daily_rollup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM bump_daily_rollup(
+                    COALESCE(NEW.completed_at, CURRENT_TIMESTAMP)::DATE, 0, 0, 0, 1,
+                    COALESCE((SELECT round(reward * 100)::BIGINT FROM tasks WHERE id = NEW.task_id), 0)
+                );
+            ELSE
+                PERFORM bump_daily_rollup(
+                    COALESCE(OLD.completed_at, CURRENT_TIMESTAMP)::DATE, 0, 0, 0, -1,
+                    -COALESCE((SELECT round(reward * 100)::BIGINT FROM tasks WHERE id = OLD.task_id), 0)
+                );
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER user_tasks_daily_rollup AFTER INSERT OR DELETE ON user_tasks
+        FOR EACH ROW EXECUTE FUNCTION user_tasks_daily_rollup()
+        """,
+        # Backfill history once from the raw tables; from here on the triggers keep it current
+        """
+        INSERT INTO daily_rollups (day, new_users, registration_revenue)
+        SELECT u.registration_date::DATE, COUNT(*), COALESCE(SUM(p.price), 0)
+        FROM users u LEFT JOIN package_prices p ON p.package = u.package
+        WHERE u.payment_status = 'registered' AND u.registration_date IS NOT NULL
+        GROUP BY 1
+        """,
+        """
+        INSERT INTO daily_rollups (day, coupon_revenue)
+        SELECT approved_at::DATE, COALESCE(SUM(total_amount), 0) FROM payments
+        WHERE status = 'approved' AND approved_at IS NOT NULL
+        GROUP BY 1
+        ON CONFLICT (day) DO UPDATE SET coupon_revenue = EXCLUDED.coupon_revenue
+        """,
+        """
+        INSERT INTO daily_rollups (day, tasks_completed, rewards_cents)
+        SELECT ut.completed_at::DATE, COUNT(*), COALESCE(SUM(round(t.reward * 100)), 0)
+        FROM user_tasks ut JOIN tasks t ON t.id = ut.task_id
+        WHERE ut.completed_at IS NOT NULL
+        GROUP BY 1
+        ON CONFLICT (day) DO UPDATE SET tasks_completed = EXCLUDED.tasks_completed, rewards_cents = EXCLUDED.rewards_cents
+        """,
+    ]),
+    (10, "reminder_runs_and_user_timezones", [
+        # IANA name set with /timezone; NULL means the bot's REMINDER_TIMEZONE
+        "ALTER TABLE users ADD COLUMN timezone TEXT",
+        """
+        CREATE TABLE reminder_runs (
+            id BIGSERIAL PRIMARY KEY,
+            slot TIMESTAMPTZ NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'running',
+            shards INTEGER NOT NULL,
+            shards_done INTEGER NOT NULL DEFAULT 0,
+            window_seconds INTEGER NOT NULL,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+    ]),
+    (11, "unreachable_users", [
+        # Set when a fan-out gets Forbidden or "chat not found"; cleared by /start
+        "ALTER TABLE users ADD COLUMN unreachable_since TIMESTAMP",
+        "DROP INDEX IF EXISTS idx_users_alarm_on",
+        "CREATE INDEX idx_users_alarm_on ON users (chat_id) WHERE alarm_setting = 1 AND unreachable_since IS NULL",
+    ]),
+    (12, "broadcast_leases", [
+        # Which worker is sending a running broadcast, and until when; NULL lease_until means up for grabs
+        "ALTER TABLE broadcasts ADD COLUMN lease_owner TEXT, ADD COLUMN lease_until TIMESTAMP",
+    ]),
+    (13, "reminder_run_checkpoints", [
+        # last_chat_id is where an interrupted run resumes; failed_shards counts shards a database error cut short
+        "ALTER TABLE reminder_runs ADD COLUMN last_chat_id BIGINT, "
+        "ADD COLUMN failed_shards INTEGER NOT NULL DEFAULT 0, ADD COLUMN last_error TEXT",
+    ]),
+]
+
+async def migrate(migrations=MIGRATIONS):
+    async with db.transaction() as cursor:
+        await cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        await cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in await cursor.fetchall()}
+        # All pending migrations run in this one transaction, so a failure leaves the schema untouched
+        for version, name, statements in sorted(migrations):
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            for statement in statements:
+                await cursor.execute(statement)
+            await cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
@@ -0,0 +1,209 @@
+import asyncio
+import datetime
+import logging
+import os
+
+import psycopg
+
+import db
+from broadcast import BLOCKED, FAILED, MIN_CHAT_ID, SENT, delivery_tracker, send_limiter, send_message
+from interaction_log import interaction_writer
+
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", 8))  # local hour reminders start going out
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "UTC")  # for users who haven't set /timezone
+REMINDER_WINDOW = int(os.getenv("REMINDER_WINDOW", 3600))  # seconds each run's sends are spread over
+REMINDER_SHARDS = int(os.getenv("REMINDER_SHARDS", 60))
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", 10))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 200))
+REMINDER_MESSAGE = "🌟 Daily Reminder: Complete your Ethereal tasks to maximize your earnings!"
+
+logger = logging.getLogger(__name__)
+
+# Sends the daily reminder to every subscriber whose local time has just reached REMINDER_HOUR.
+# Runs are started hourly; each one splits its recipients into shards of consecutive chat_ids and starts
+# one shard every window/shards seconds, so neither Telegram nor PostgreSQL sees the whole list at once.
+class ReminderDispatcher:
+    # One row per hour slot: the unique slot stops a second worker (or a restart) from sending it again
+    START_RUN = """
+    INSERT INTO reminder_runs (slot, shards, window_seconds) VALUES (%s, %s, %s)
+    ON CONFLICT (slot) DO NOTHING RETURNING id
+    """
+    # A run a clean shutdown interrupted is picked up by one restarting worker while its window is still open
+    RESUME = """
+    UPDATE reminder_runs SET status='running' WHERE status='interrupted' AND slot >= %s
+    RETURNING id, slot, shards_done, last_chat_id, sent, failed, blocked, failed_shards
+    """
+    PROGRESS = """
+    UPDATE reminder_runs SET shards_done=%s, last_chat_id=%s, sent=%s, failed=%s, blocked=%s, failed_shards=%s, last_error=%s
+    WHERE id=%s
+    """
+    FINISH = "UPDATE reminder_runs SET status=%s, finished_at=%s WHERE id=%s"
+    KNOWN_TIMEZONE = "SELECT name FROM pg_timezone_names WHERE lower(name) = lower(%s) ORDER BY name = %s DESC LIMIT 1"
+    # Resolving the slot's hour once per zone lets the recipient queries match timezone names instead of
+    # converting the slot for every subscriber row
+    DUE_TIMEZONES = """
+    SELECT ARRAY(SELECT name FROM pg_timezone_names WHERE EXTRACT(HOUR FROM %(slot)s::TIMESTAMPTZ AT TIME ZONE name) = %(hour)s),
+           EXTRACT(HOUR FROM %(slot)s::TIMESTAMPTZ AT TIME ZONE %(default_timezone)s) = %(hour)s
+    """
+    DUE = "(timezone = ANY(%(timezones)s) OR (timezone IS NULL AND %(default_due)s))"
+    COUNT_RECIPIENTS = f"""
+    SELECT COUNT(*) FROM users
+    WHERE alarm_setting = 1 AND unreachable_since IS NULL AND chat_id > %(after)s AND {DUE}
+    """
+    # Keyset pages rather than one server-side cursor: a cursor would hold its transaction (and snapshot) open
+    # across the whole sending window, pinning vacuum for an hour, whereas each page is a short index range scan
+    RECIPIENTS = f"""
+    SELECT chat_id FROM users
+    WHERE alarm_setting = 1 AND unreachable_since IS NULL AND chat_id > %(after)s AND {DUE}
+    ORDER BY chat_id LIMIT %(limit)s
+    """
+    RECENT = """
+    SELECT id, slot, status, shards_done, shards, sent, failed, blocked, failed_shards, last_error, started_at, finished_at
+    FROM reminder_runs ORDER BY id DESC LIMIT %s
+    """
+
+    def __init__(self, hour=8, default_timezone="UTC", window=3600, shards=60, concurrency=10, batch_size=200, limiter=send_limiter):
+        self.hour = hour
+        self.default_timezone = default_timezone
+        self.window = window
+        self.shards = shards
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.limiter = limiter
+        self.bot = None
+        self._tasks = set()
+
+    # Called at the top of every hour; returns the run id, or None when this slot already ran
+    async def start(self, bot, slot=None):
+        self.bot = bot
+        if slot is None:
+            # Rounded to the nearest hour, so a job that fires a little early still gets its own slot
+            now = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=30)
+            slot = now.replace(minute=0, second=0, microsecond=0)
+        row = await db.fetchone(self.START_RUN, (slot, self.shards, self.window))
+        if not row:
+            logger.info(f"Reminder slot {slot:%Y-%m-%d %H:%M} UTC has already been started, skipping")
+            return None
+        self._spawn(row[0], slot)
+        return row[0]
+
+    # Called once at startup; unsent shards of runs interrupted longer ago than the window are dropped
+    async def resume(self, bot):
+        self.bot = bot
+        oldest = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.window)
+        rows = await db.fetchall(self.RESUME, (oldest,))
+        for run_id, slot, shards_done, last_chat_id, sent, failed, blocked, failed_shards in rows:
+            logger.info(f"Resuming reminder run #{run_id} at shard {shards_done + 1}/{self.shards}")
+            self._spawn(run_id, slot, shards_done, last_chat_id, {SENT: sent, FAILED: failed, BLOCKED: blocked}, failed_shards)
+        return len(rows)
+
+    # Returns PostgreSQL's spelling of a timezone name, or None when PostgreSQL does not know it
+    async def known_timezone(self, name):
+        row = await db.fetchone(self.KNOWN_TIMEZONE, (name, name))
+        return row[0] if row else None
+
+    def _spawn(self, run_id, slot, *progress):
+        task = asyncio.create_task(self._run(run_id, slot, *progress))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, run_id, slot, *progress):
+        status = "failed"
+        try:
+            await self.run(run_id, slot, *progress)
+            status = "finished"
+        except asyncio.CancelledError:
+            status = "interrupted"
+            raise
+        except Exception as e:
+            logger.error(f"Reminder run #{run_id} stopped with an error: {e}")
+        finally:
+            await db.execute(self.FINISH, (status, datetime.datetime.now(), run_id))
+
+    # Recipients are walked in chat_id order, so a shard is the next run of consecutive due chat_ids and a
+    # resumed run carries on after the last chat_id checkpointed
+    async def run(self, run_id, slot, first_shard=0, last_chat_id=None, counts=None, failed_shards=0):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = counts or {SENT: 0, FAILED: 0, BLOCKED: 0}
+        after = last_chat_id if last_chat_id is not None else MIN_CHAT_ID
+        timezones, default_due = await db.fetchone(self.DUE_TIMEZONES, {
+            "slot": slot,
+            "hour": self.hour,
+            "default_timezone": self.default_timezone,
+        })
+        params = {"timezones": timezones, "default_due": default_due}
+        # One count up front sizes the shards, and an hour with nobody due skips the shard loop entirely
+        due = (await db.fetchone(self.COUNT_RECIPIENTS, {**params, "after": after}))[0]
+        if not due:
+            logger.info(f"Reminder run #{run_id}: no subscribers are due")
+            return
+        shards = self.shards - first_shard
+        per_shard = -(-due // shards)
+
+        async def deliver(chat_id):
+            async with semaphore:
+                return chat_id, await send_message(self.bot, chat_id, REMINDER_MESSAGE, limiter=self.limiter)
+
+        last_error = None
+
+        async def checkpoint(shards_done):
+            await db.execute(self.PROGRESS, (
+                shards_done, after, counts[SENT], counts[FAILED], counts[BLOCKED], failed_shards, last_error, run_id
+            ))
+
+        for index, shard in enumerate(range(first_shard, self.shards)):
+            delay = started + index * self.window / self.shards - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # The last shard also takes whoever became due after the count
+            remaining = per_shard if shard < self.shards - 1 else None
+            try:
+                while remaining is None or remaining > 0:
+                    limit = self.batch_size if remaining is None else min(self.batch_size, remaining)
+                    batch = [row[0] for row in await db.fetchall(self.RECIPIENTS, {**params, "after": after, "limit": limit})]
+                    if not batch:
+                        break
+                    results = await asyncio.gather(*(deliver(chat_id) for chat_id in batch))
+                    after = batch[-1]
+                    if remaining is not None:
+                        remaining -= len(batch)
+                    for chat_id, outcome in results:
+                        counts[outcome] += 1
+                        if outcome == SENT:
+                            await interaction_writer.log(chat_id, "daily_reminder")
+                    await delivery_tracker.mark_unreachable([chat_id for chat_id, outcome in results if outcome == BLOCKED])
+                    # Checkpointed per page, as broadcasts are, so a restart mid-shard resends at most one page
+                    await checkpoint(shard)
+            except psycopg.Error as e:
+                # The shard's unsent recipients are still after the checkpoint, so the next shard picks them up
+                failed_shards += 1
+                last_error = str(e)
+                logger.error(f"Reminder run #{run_id} shard {shard + 1}/{self.shards} failed: {e}")
+            try:
+                await checkpoint(shard + 1)
+            except psycopg.Error as e:
+                logger.error(f"Reminder run #{run_id} could not checkpoint shard {shard + 1}: {e}")
+        logger.info(
+            f"Reminder run #{run_id} finished: sent={counts[SENT]} failed={counts[FAILED]} blocked={counts[BLOCKED]} "
+            f"failed_shards={failed_shards}"
+        )
+
+    async def recent(self, limit=5):
+        return await db.fetchall(self.RECENT, (limit,))
+
+reminder_dispatcher = ReminderDispatcher(
+    hour=REMINDER_HOUR,
+    default_timezone=REMINDER_TIMEZONE,
+    window=REMINDER_WINDOW,
+    shards=REMINDER_SHARDS,
+    concurrency=REMINDER_CONCURRENCY,
+    batch_size=REMINDER_BATCH_SIZE,
+)
@@ -0,0 +1,510 @@
+import datetime
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from psycopg.rows import class_row
+
+import db
+from cache import TTLCache
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 300))
+TASK_CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", 60))  # bounds how stale another worker's /add_task can look
+COMPLETED_TASKS_CACHE_SIZE = int(os.getenv("COMPLETED_TASKS_CACHE_SIZE", 10000))
+COMPLETED_TASKS_CACHE_TTL = float(os.getenv("COMPLETED_TASKS_CACHE_TTL", 600))
+
+# Balances are kept in integer cents; see balance_ledger
+REFERRAL_JOIN_BONUS_CENTS = 10
+REFERRAL_REGISTRATION_BONUS_CENTS = {"Standard": 40}
+REFERRAL_REGISTRATION_BONUS_DEFAULT_CENTS = 90
+
+# Typed rows
+@dataclass(frozen=True)
+class UserProfile:
+    chat_id: int
+    payment_status: Optional[str]
+    package: Optional[str]
+    balance: float
+    selected_coach: Optional[int]
+    alarm_setting: int
+    streaks: int
+    invites: int
+    referral_code: Optional[str]
+    referred_by: Optional[int]
+
+@dataclass
+class UserDetails:
+    chat_id: int
+    username: Optional[str]
+    email: Optional[str]
+    name: Optional[str]
+    phone: Optional[str]
+    password: Optional[str]
+    package: Optional[str]
+
+@dataclass
+class Task:
+    id: int
+    type: str
+    link: str
+    reward: float
+    created_at: Optional[datetime.datetime]
+    expires_at: Optional[datetime.datetime]
+
+@dataclass
+class Payment:
+    id: int
+    chat_id: int
+    type: Optional[str]
+    package: Optional[str]
+    quantity: Optional[int]
+    total_amount: Optional[int]
+    payment_account: Optional[str]
+    status: str
+
+@dataclass
+class PaymentAccount:
+    country: str
+    flag: str
+    details: str
+    is_active: int
+
+@dataclass
+class DailySummary:
+    new_users: int
+    registration_revenue: int
+    coupon_revenue: int
+    tasks_completed: int
+    rewards_cents: int
+
+@dataclass
+class Coach:
+    coach_id: int
+    name: str
+
+# All hot-path statements go through prepare=True so PostgreSQL parses and plans them once per pooled connection
+class UserRepository:
+    PROFILE_COLUMNS = "chat_id, payment_status, package, balance_cents::FLOAT8 / 100 AS balance, selected_coach, alarm_setting, streaks, invites, referral_code, referred_by"
+
+    GET_PROFILE = f"SELECT {PROFILE_COLUMNS} FROM users WHERE chat_id=%s"
+    GET_STATUS = "SELECT payment_status FROM users WHERE chat_id=%s"
+    GET_DETAILS = "SELECT chat_id, username, email, name, phone, password, package FROM users WHERE chat_id=%s"
+    FIND_REGISTERED_BY_EMAIL = (
+        "SELECT chat_id, username, email, name, phone, password, package FROM users "
+        "WHERE email=%s AND chat_id=%s AND payment_status='registered'"
+    )
+    CREATE = (
+        "INSERT INTO users (chat_id, username, referral_code, referred_by) VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT (chat_id) DO NOTHING RETURNING chat_id"
+    )
+    COUNT_REFERRAL_JOIN = "UPDATE users SET invites = invites + 1 WHERE chat_id=%s"
+    SELECT_PACKAGE = (
+        "INSERT INTO users (chat_id, package, payment_status, username) VALUES (%s, %s, 'pending_payment', %s) "
+        "ON CONFLICT (chat_id) DO UPDATE SET package=EXCLUDED.package, payment_status='pending_payment'"
+    )
+    SET_COACH = "UPDATE users SET selected_coach=%s WHERE chat_id=%s"
+    MARK_SCREENSHOT = "UPDATE users SET screenshot_uploaded_at=%s WHERE chat_id=%s RETURNING selected_coach"
+    APPROVE_PAYMENT = "UPDATE users SET payment_status='pending_details', approved_at=%s WHERE chat_id=%s"
+    SAVE_DETAILS = "UPDATE users SET email=%s, name=%s, username=%s, phone=%s, password=%s WHERE chat_id=%s RETURNING package"
+    FINALIZE_REGISTRATION = (
+        "UPDATE users SET username=%s, password=%s, payment_status='registered', registration_date=%s WHERE chat_id=%s "
+        f"RETURNING {PROFILE_COLUMNS}"
+    )
+    SET_PASSWORD = "UPDATE users SET password=%s WHERE chat_id=%s"
+    # Every balance change goes through the ledger; returns the new balance in cents (NULL for an unknown user)
+    POST_BALANCE_ENTRY = "SELECT post_balance_entry(%s, %s, %s, %s)"
+    TOGGLE_REMINDER = "UPDATE users SET alarm_setting = 1 - alarm_setting WHERE chat_id=%s RETURNING alarm_setting"
+    SET_REMINDER = "UPDATE users SET alarm_setting=%s WHERE chat_id=%s"
+    SET_TIMEZONE = "UPDATE users SET timezone=%s WHERE chat_id=%s"
+    GET_TIMEZONE = "SELECT timezone FROM users WHERE chat_id=%s"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    # Read-through: every write method below invalidates the rows it touches
+    async def get_profile(self, chat_id):
+        profile = self.cache.get(chat_id)
+        if profile is not None:
+            return profile
+        epoch = self.cache.epoch
+        profile = await db.fetchone(self.GET_PROFILE, (chat_id,), prepare=True, row_factory=class_row(UserProfile))
+        if profile is not None:
+            self.cache.set(chat_id, profile, epoch=epoch)
+        return profile
+
+    # fresh=True reads past the cache: the cached profile can trail an approval made by another worker
+    async def get_status(self, chat_id, fresh=False):
+        if fresh:
+            row = await db.fetchone(self.GET_STATUS, (chat_id,), prepare=True)
+            return row[0] if row else None
+        profile = await self.get_profile(chat_id)
+        return profile.payment_status if profile else None
+
+    async def get_details(self, chat_id):
+        return await db.fetchone(self.GET_DETAILS, (chat_id,), prepare=True, row_factory=class_row(UserDetails))
+
+    async def find_registered_by_email(self, chat_id, email):
+        return await db.fetchone(self.FIND_REGISTERED_BY_EMAIL, (email, chat_id), prepare=True, row_factory=class_row(UserDetails))
+
+    # Returns True when a new user row was created (and the referrer credited)
+    async def create(self, chat_id, username, referral_code, referred_by=None):
+        async with db.transaction() as cursor:
+            await cursor.execute(self.CREATE, (chat_id, username, referral_code, referred_by), prepare=True)
+            if not await cursor.fetchone():
+                return False
+            if referred_by:
+                await cursor.execute(self.COUNT_REFERRAL_JOIN, (referred_by,), prepare=True)
+                await cursor.execute(
+                    self.POST_BALANCE_ENTRY, (referred_by, REFERRAL_JOIN_BONUS_CENTS, "referral_join", str(chat_id)), prepare=True
+                )
+        self.cache.invalidate(chat_id, referred_by)
+        return True
+
+    async def select_package(self, chat_id, package, username):
+        await db.execute(self.SELECT_PACKAGE, (chat_id, package, username), prepare=True)
+        self.cache.invalidate(chat_id)
+
+    async def set_coach(self, chat_id, coach_id):
+        await db.execute(self.SET_COACH, (coach_id, chat_id), prepare=True)
+        self.cache.invalidate(chat_id)
+
+    async def mark_screenshot(self, chat_id):
+        row = await db.fetchone(self.MARK_SCREENSHOT, (datetime.datetime.now(), chat_id), prepare=True)
+        return row[0] if row else None
+
+    async def approve_payment(self, chat_id):
+        await db.execute(self.APPROVE_PAYMENT, (datetime.datetime.now(), chat_id), prepare=True)
+        self.cache.invalidate(chat_id)
+
+    async def save_details(self, chat_id, email, name, username, phone, password):
+        row = await db.fetchone(self.SAVE_DETAILS, (email, name, username, phone, password, chat_id), prepare=True)
+        return row[0] if row else None
+
+    # Marks the user registered and pays the referrer's registration bonus in the same transaction
+    async def finalize_registration(self, chat_id, username, password):
+        async with db.transaction(row_factory=class_row(UserProfile)) as cursor:
+            await cursor.execute(self.FINALIZE_REGISTRATION, (username, password, datetime.datetime.now(), chat_id), prepare=True)
+            profile = await cursor.fetchone()
+            if profile and profile.referred_by:
+                bonus = REFERRAL_REGISTRATION_BONUS_CENTS.get(profile.package, REFERRAL_REGISTRATION_BONUS_DEFAULT_CENTS)
+                await cursor.execute(
+                    self.POST_BALANCE_ENTRY, (profile.referred_by, bonus, "referral_registration", str(chat_id)), prepare=True
+                )
+        self.cache.invalidate(chat_id, profile.referred_by if profile else None)
+        return profile
+
+    async def set_password(self, chat_id, password):
+        await db.execute(self.SET_PASSWORD, (password, chat_id), prepare=True)
+
+    async def toggle_reminder(self, chat_id):
+        row = await db.fetchone(self.TOGGLE_REMINDER, (chat_id,), prepare=True)
+        self.cache.invalidate(chat_id)
+        return row[0] if row else None
+
+    async def set_reminder(self, chat_id, enabled):
+        await db.execute(self.SET_REMINDER, (1 if enabled else 0, chat_id), prepare=True)
+        self.cache.invalidate(chat_id)
+
+    # Returns False when the user does not exist
+    async def set_timezone(self, chat_id, timezone):
+        return await db.execute(self.SET_TIMEZONE, (timezone, chat_id)) > 0
+
+    async def get_timezone(self, chat_id):
+        row = await db.fetchone(self.GET_TIMEZONE, (chat_id,))
+        return row[0] if row else None
+
+class TaskRepository:
+    COLUMNS = "id, type, link, reward, created_at, expires_at"
+
+    GET = f"SELECT {COLUMNS} FROM tasks WHERE id=%s"
+    CREATE = "INSERT INTO tasks (type, link, reward, created_at, expires_at) VALUES (%s, %s, %s, %s, %s) RETURNING id"
+    LIST_ACTIVE = f"SELECT {COLUMNS} FROM tasks WHERE expires_at > %s ORDER BY id"
+    # One statement for the whole batch: the columns travel as arrays and unnest() turns them back into rows
+    CREATE_MANY = """
+    INSERT INTO tasks (type, link, reward, created_at, expires_at)
+    SELECT type, link, reward, %s, expires_at
+    FROM unnest(%s::text[], %s::text[], %s::real[], %s::timestamp[]) AS t(type, link, reward, expires_at)
+    RETURNING id
+    """
+    EXPIRE = "UPDATE tasks SET expires_at=%s WHERE id = ANY(%s) AND expires_at > %s RETURNING id"
+    EXPIRE_ALL = "UPDATE tasks SET expires_at=%s WHERE expires_at > %s RETURNING id"
+    # Tasks someone already completed stay, because user_tasks references them
+    DELETE_UNUSED = """
+    DELETE FROM tasks t WHERE t.id = ANY(%s)
+    AND NOT EXISTS (SELECT 1 FROM user_tasks ut WHERE ut.task_id = t.id)
+    RETURNING id
+    """
+    LIST_COMPLETED = "SELECT task_id FROM user_tasks WHERE user_id=%s"
+    # Insert-if-absent plus ledger entry and balance credit in one statement: the reward is posted only
+    # when this call inserted the completion, so a duplicate or concurrent tap credits nothing
+    CREDIT_COMPLETION = """
+    WITH task AS (
+        SELECT id, reward, round(reward * 100)::BIGINT AS reward_cents FROM tasks WHERE id = %(task_id)s
+    ), inserted AS (
+        INSERT INTO user_tasks (user_id, task_id, completed_at)
+        SELECT %(user_id)s, id, %(completed_at)s FROM task
+        ON CONFLICT (user_id, task_id) DO NOTHING
+        RETURNING task_id
+    ), credited AS (
+        UPDATE users SET balance_cents = balance_cents + task.reward_cents
+        FROM task JOIN inserted ON inserted.task_id = task.id
+        WHERE users.chat_id = %(user_id)s
+        RETURNING users.chat_id, task.id, task.reward_cents
+    ), entry AS (
+        INSERT INTO balance_ledger (chat_id, amount_cents, reason, ref)
+        SELECT chat_id, reward_cents, 'task_reward', id::TEXT FROM credited
+    )
+    SELECT reward FROM task WHERE EXISTS (SELECT 1 FROM inserted)
+    """
+    GET_REWARD_CENTS = "SELECT round(reward * 100)::BIGINT FROM tasks WHERE id=%s"
+    LOCK_BALANCE = "SELECT balance_cents FROM users WHERE chat_id=%s FOR UPDATE"
+    DELETE_COMPLETION = "DELETE FROM user_tasks WHERE user_id=%s AND task_id=%s RETURNING task_id"
+
+    def __init__(self, profile_cache, completed_cache, active_ttl=60):
+        self.profile_cache = profile_cache
+        self.completed_cache = completed_cache
+        self.active_ttl = active_ttl
+        self._active = None
+        self._active_until = 0.0
+        self._active_epoch = 0
+
+    async def get(self, task_id):
+        return await db.fetchone(self.GET, (task_id,), prepare=True, row_factory=class_row(Task))
+
+    async def create(self, task_type, link, reward, created_at, expires_at):
+        row = await db.fetchone(self.CREATE, (task_type, link, reward, created_at, expires_at))
+        self.invalidate_active()
+        return row[0]
+
+    # Inserts TaskSpecs in one transaction; returns the new ids
+    async def create_many(self, specs, created_at=None):
+        created_at = created_at or datetime.datetime.now()
+        rows = await db.fetchall(self.CREATE_MANY, (
+            created_at,
+            [spec.type for spec in specs],
+            [spec.link for spec in specs],
+            [spec.reward for spec in specs],
+            [spec.expires_at for spec in specs],
+        ))
+        self.invalidate_active()
+        return [row[0] for row in rows]
+
+    # Expires the given active tasks now (all active tasks when task_ids is None); returns the expired ids
+    async def expire(self, task_ids=None, now=None):
+        now = now or datetime.datetime.now()
+        if task_ids is None:
+            rows = await db.fetchall(self.EXPIRE_ALL, (now, now))
+        else:
+            rows = await db.fetchall(self.EXPIRE, (now, list(task_ids), now))
+        self.invalidate_active()
+        return [row[0] for row in rows]
+
+    # Returns the ids actually deleted
+    async def delete_many(self, task_ids):
+        rows = await db.fetchall(self.DELETE_UNUSED, (list(task_ids),))
+        self.invalidate_active()
+        return [row[0] for row in rows]
+
+    def invalidate_active(self):
+        self._active_epoch += 1
+        self._active = None
+
+    # Non-expired tasks, reloaded after active_ttl or as soon as the earliest one expires
+    async def list_active(self, now=None):
+        now = now or datetime.datetime.now()
+        if self._active is not None and time.monotonic() < self._active_until and (not self._active or now < self._active[0]):
+            return self._active[1]
+        epoch = self._active_epoch
+        tasks = tuple(await db.fetchall(self.LIST_ACTIVE, (now,), prepare=True, row_factory=class_row(Task)))
+        if epoch == self._active_epoch:
+            next_expiry = min((task.expires_at for task in tasks if task.expires_at), default=datetime.datetime.max)
+            self._active = (next_expiry, tasks)
+            self._active_until = time.monotonic() + self.active_ttl
+        return tasks
+
+    async def completed_task_ids(self, chat_id):
+        completed = self.completed_cache.get(chat_id)
+        if completed is not None:
+            return completed
+        epoch = self.completed_cache.epoch
+        completed = frozenset(row[0] for row in await db.fetchall(self.LIST_COMPLETED, (chat_id,), prepare=True))
+        self.completed_cache.set(chat_id, completed, epoch=epoch)
+        return completed
+
+    # Set difference in memory instead of an anti-join against user_tasks per request
+    async def list_available(self, chat_id, now=None):
+        now = now or datetime.datetime.now()
+        completed = await self.completed_task_ids(chat_id)
+        return [task for task in await self.list_active(now) if task.id not in completed and task.expires_at > now]
+
+    # Applies a completion change to a cached set; invalidating first stops a racing load from caching the old set
+    def _update_completed(self, chat_id, task_id, done):
+        completed = self.completed_cache.get(chat_id)
+        self.completed_cache.invalidate(chat_id)
+        if completed is not None:
+            self.completed_cache.set(chat_id, completed | {task_id} if done else completed - {task_id})
+
+    # Records the completion and credits the task reward in one round trip; returns the reward,
+    # or None when the task does not exist or was already credited to this user
+    async def complete(self, user_id, task_id):
+        row = await db.fetchone(
+            self.CREDIT_COMPLETION,
+            {"user_id": user_id, "task_id": task_id, "completed_at": datetime.datetime.now()},
+            prepare=True,
+        )
+        if row is None:
+            return None
+        self.profile_cache.invalidate(user_id)
+        self._update_completed(user_id, task_id, True)
+        return row[0]
+
+    # Removes the completion and posts a reversing ledger entry; returns False when there is no
+    # completion to revoke or the balance cannot cover it. The row lock on users serializes revokes per user.
+    async def revoke(self, user_id, task_id):
+        async with db.transaction() as cursor:
+            await cursor.execute(self.LOCK_BALANCE, (user_id,), prepare=True)
+            row = await cursor.fetchone()
+            await cursor.execute(self.GET_REWARD_CENTS, (task_id,), prepare=True)
+            reward = await cursor.fetchone()
+            if not row or not reward or row[0] < reward[0]:
+                return False
+            await cursor.execute(self.DELETE_COMPLETION, (user_id, task_id), prepare=True)
+            if not await cursor.fetchone():
+                return False
+            await cursor.execute(UserRepository.POST_BALANCE_ENTRY, (user_id, -reward[0], "task_revoked", str(task_id)), prepare=True)
+        self.profile_cache.invalidate(user_id)
+        self._update_completed(user_id, task_id, False)
+        return True
+
+class PaymentRepository:
+    COLUMNS = "id, chat_id, type, package, quantity, total_amount, payment_account, status"
+
+    GET = f"SELECT {COLUMNS} FROM payments WHERE id=%s"
+    CREATE_COUPON = (
+        "INSERT INTO payments (chat_id, type, package, quantity, total_amount, payment_account, status) "
+        "VALUES (%s, 'coupon', %s, %s, %s, %s, 'pending_payment') RETURNING id"
+    )
+    APPROVE = "UPDATE payments SET status='approved', approved_at=%s WHERE id=%s"
+    INSERT_COUPON = "INSERT INTO coupons (payment_id, code) VALUES (%s, %s)"
+    LIST_ACTIVE_ACCOUNTS = "SELECT country, flag, details, is_active FROM payment_accounts WHERE is_active=1"
+    ADD_ACCOUNT = "INSERT INTO payment_accounts (country, flag, details) VALUES (%s, %s, %s)"
+    DELETE_ACCOUNT = "DELETE FROM payment_accounts WHERE country=%s"
+
+    async def get(self, payment_id):
+        return await db.fetchone(self.GET, (payment_id,), prepare=True, row_factory=class_row(Payment))
+
+    async def create_coupon_payment(self, chat_id, package, quantity, total_amount, country):
+        row = await db.fetchone(self.CREATE_COUPON, (chat_id, package, quantity, total_amount, country), prepare=True)
+        return row[0]
+
+    async def approve(self, payment_id):
+        await db.execute(self.APPROVE, (datetime.datetime.now(), payment_id), prepare=True)
+
+    # Stores the coupon codes for a payment; returns the buyer's chat_id
+    async def add_coupons(self, payment_id, codes):
+        async with db.transaction() as cursor:
+            await cursor.executemany(self.INSERT_COUPON, [(payment_id, code) for code in codes])
+            await cursor.execute(self.GET, (payment_id,), prepare=True)
+            row = await cursor.fetchone()
+            return row[1] if row else None
+
+    async def list_active_accounts(self):
+        return await db.fetchall(self.LIST_ACTIVE_ACCOUNTS, prepare=True, row_factory=class_row(PaymentAccount))
+
+    async def add_account(self, country, flag, details):
+        await db.execute(self.ADD_ACCOUNT, (country, flag, details))
+
+    async def delete_account(self, country):
+        return await db.execute(self.DELETE_ACCOUNT, (country,)) > 0
+
+class CoachRepository:
+    GET = "SELECT coach_id, name FROM coaches WHERE coach_id=%s"
+    LIST = "SELECT coach_id, name FROM coaches"
+    ADD = "INSERT INTO coaches (coach_id, name, added_by) VALUES (%s, %s, %s) ON CONFLICT (coach_id) DO NOTHING"
+    REMOVE = "DELETE FROM coaches WHERE coach_id=%s"
+
+    async def get(self, coach_id):
+        return await db.fetchone(self.GET, (coach_id,), prepare=True, row_factory=class_row(Coach))
+
+    async def list_all(self):
+        return await db.fetchall(self.LIST, prepare=True, row_factory=class_row(Coach))
+
+    # Returns False when the coach already exists
+    async def add(self, coach_id, name, added_by):
+        return await db.execute(self.ADD, (coach_id, name, added_by)) > 0
+
+    async def remove(self, coach_id):
+        return await db.execute(self.REMOVE, (coach_id,)) > 0
+
+# Counters in stat_counters are maintained by triggers on users and by the interaction writer
+class StatsRepository:
+    COUNTERS = "SELECT name, value FROM stat_counters"
+    INTERACTIONS_SINCE = "SELECT COALESCE(SUM(interactions), 0) FROM interaction_rollups WHERE bucket >= %s"
+    # daily_rollups is kept current by triggers on users, payments and user_tasks
+    DAILY_SUMMARY = """
+    SELECT COALESCE(SUM(new_users), 0)::INTEGER AS new_users,
+           COALESCE(SUM(registration_revenue), 0)::BIGINT AS registration_revenue,
+           COALESCE(SUM(coupon_revenue), 0)::BIGINT AS coupon_revenue,
+           COALESCE(SUM(tasks_completed), 0)::INTEGER AS tasks_completed,
+           COALESCE(SUM(rewards_cents), 0)::BIGINT AS rewards_cents
+    FROM daily_rollups WHERE day BETWEEN %s AND %s
+    """
+
+    async def counters(self):
+        return dict(await db.fetchall(self.COUNTERS, prepare=True))
+
+    # Counts whole minutes, so the window can include up to a minute before `since`
+    async def interactions_since(self, since):
+        bucket = since.replace(second=0, microsecond=0)
+        row = await db.fetchone(self.INTERACTIONS_SINCE, (bucket,), prepare=True)
+        return row[0]
+
+    # Totals for first_day..last_day inclusive
+    async def daily_summary(self, first_day, last_day=None):
+        return await db.fetchone(self.DAILY_SUMMARY, (first_day, last_day or first_day), prepare=True, row_factory=class_row(DailySummary))
+
+# balance_ledger is the source of truth; users.balance_cents is its running sum, kept in step by every writer
+class LedgerRepository:
+    # Every worker schedules the reconciliation; only the one holding this lock runs it
+    RECONCILE_LOCK_ID = 715002
+    TRY_LOCK = "SELECT pg_try_advisory_xact_lock(%s)"
+    # Adjusts by the difference instead of assigning the sum, so a credit committed while this runs is not lost
+    RECONCILE = """
+    WITH drift AS (
+        SELECT u.chat_id, u.balance_cents AS stored, COALESCE(l.total, 0) AS expected
+        FROM users u
+        LEFT JOIN (SELECT chat_id, SUM(amount_cents)::BIGINT AS total FROM balance_ledger GROUP BY chat_id) l USING (chat_id)
+        WHERE u.balance_cents <> COALESCE(l.total, 0)
+    )
+    UPDATE users SET balance_cents = users.balance_cents + (drift.expected - drift.stored)
+    FROM drift WHERE users.chat_id = drift.chat_id
+    RETURNING users.chat_id, drift.stored, drift.expected
+    """
+
+    def __init__(self, profile_cache):
+        self.profile_cache = profile_cache
+
+    # Returns [(chat_id, stored_cents, ledger_cents)] for every balance that had drifted and was corrected,
+    # or None when another worker is already reconciling (two runs would each apply the same correction)
+    async def reconcile(self):
+        async with db.transaction() as cursor:
+            await cursor.execute(self.TRY_LOCK, (self.RECONCILE_LOCK_ID,))
+            if not (await cursor.fetchone())[0]:
+                return None
+            await cursor.execute(self.RECONCILE)
+            rows = await cursor.fetchall()
+        if rows:
+            self.profile_cache.invalidate(*(row[0] for row in rows))
+        return rows
+
+profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+completed_tasks_cache = TTLCache(maxsize=COMPLETED_TASKS_CACHE_SIZE, ttl=COMPLETED_TASKS_CACHE_TTL)
+
+user_repo = UserRepository(profile_cache)
+task_repo = TaskRepository(profile_cache, completed_tasks_cache, active_ttl=TASK_CACHE_TTL)
+payment_repo = PaymentRepository()
+coach_repo = CoachRepository()
+stats_repo = StatsRepository()
+ledger_repo = LedgerRepository(profile_cache)
@@ -0,0 +1,98 @@
+import time
+
+# Per-route call counts and latency
+class RouteStats:
+    __slots__ = ("calls", "errors", "total_time", "max_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+# Routes callback data with an exact-match dict first, then the longest registered prefix from a character trie
+class CallbackRouter:
+    _HANDLER = object()
+
+    def __init__(self):
+        self._exact = {}
+        self._trie = {}
+        self.stats = {}
+
+    def exact(self, *keys):
+        def decorator(handler):
+            for key in keys:
+                self.add_exact(key, handler)
+            return handler
+        return decorator
+
+    def prefix(self, *prefixes):
+        def decorator(handler):
+            for prefix in prefixes:
+                self.add_prefix(prefix, handler)
+            return handler
+        return decorator
+
+    def add_exact(self, key, handler):
+        if key in self._exact:
+            raise ValueError(f"Callback route already registered: {key}")
+        self._exact[key] = handler
+        self.stats[key] = RouteStats()
+
+    def add_prefix(self, prefix, handler):
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if self._HANDLER in node:
+            raise ValueError(f"Callback prefix already registered: {prefix}*")
+        node[self._HANDLER] = handler
+        self.stats[prefix + "*"] = RouteStats()
+
+    def has_route(self, key):
+        return key in self._exact
+
+    # Returns (route_name, handler, payload) where payload is the data after the matched prefix
+    def resolve(self, data):
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler, ""
+        node = self._trie
+        match = None
+        for index, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._HANDLER in node:
+                match = index + 1, node[self._HANDLER]
+        if match is None:
+            return None, None, None
+        length, handler = match
+        return data[:length] + "*", handler, data[length:]
+
+    async def dispatch(self, update, context, data):
+        route, handler, payload = self.resolve(data)
+        if handler is None:
+            return False
+        stats = self.stats[route]
+        started = time.perf_counter()
+        try:
+            await handler(update, context, payload)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+        return True
+
+    # Busiest routes first, by total time spent
+    def report(self, limit=15):
+        routes = [(route, stats) for route, stats in self.stats.items() if stats.calls]
+        routes.sort(key=lambda item: item[1].total_time, reverse=True)
+        return routes[:limit]
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import time
+
+import db
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "postgres")  # "memory", "postgres" or "redis"
+STATE_TTL = int(os.getenv("STATE_TTL", 86400))  # seconds an untouched flow is kept
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+logger = logging.getLogger(__name__)
+
+# Conversation state per chat_id. get() always returns a dict; saving an empty dict deletes the entry.
+# Every save refreshes the TTL, so only flows left untouched for STATE_TTL seconds expire.
+class StateStore:
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+
+    async def get(self, chat_id):
+        raise NotImplementedError
+
+    async def set(self, chat_id, state):
+        raise NotImplementedError
+
+    async def delete(self, chat_id):
+        raise NotImplementedError
+
+    # Drops expired entries; returns how many were removed
+    async def purge(self):
+        return 0
+
+    async def close(self):
+        pass
+
+# Single-process store; also the local stand-in for the shared backends
+class MemoryStateStore(StateStore):
+    def __init__(self, ttl=86400):
+        super().__init__(ttl)
+        self._data = {}
+
+    async def get(self, chat_id):
+        entry = self._data.get(chat_id)
+        if entry is None:
+            return {}
+        state, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[chat_id]
+            return {}
+        # Callers mutate and save the returned dict, so hand out a copy like the other backends
+        return json.loads(json.dumps(state))
+
+    async def set(self, chat_id, state):
+        if not state:
+            self._data.pop(chat_id, None)
+            return
+        self._data[chat_id] = (json.loads(json.dumps(state)), time.monotonic() + self.ttl)
+
+    async def delete(self, chat_id):
+        self._data.pop(chat_id, None)
+
+    async def purge(self):
+        now = time.monotonic()
+        expired = [chat_id for chat_id, (_, expires_at) in self._data.items() if expires_at <= now]
+        for chat_id in expired:
+            del self._data[chat_id]
+        return len(expired)
+
+class PostgresStateStore(StateStore):
+    GET = "SELECT state FROM user_states WHERE chat_id=%s AND expires_at > NOW()"
+    UPSERT = """
+        INSERT INTO user_states (chat_id, state, expires_at) VALUES (%s, %s, NOW() + %s * INTERVAL '1 second')
+        ON CONFLICT (chat_id) DO UPDATE SET state=EXCLUDED.state, expires_at=EXCLUDED.expires_at
+    """
+    DELETE = "DELETE FROM user_states WHERE chat_id=%s"
+    PURGE = "DELETE FROM user_states WHERE expires_at <= NOW()"
+
+    async def get(self, chat_id):
+        row = await db.fetchone(self.GET, (chat_id,), prepare=True)
+        return row[0] if row else {}
+
+    async def set(self, chat_id, state):
+        if not state:
+            await self.delete(chat_id)
+            return
+        await db.execute(self.UPSERT, (chat_id, json.dumps(state), self.ttl), prepare=True)
+
+    async def delete(self, chat_id):
+        await db.execute(self.DELETE, (chat_id,), prepare=True)
+
+    async def purge(self):
+        return await db.execute(self.PURGE)
+
+# Needs the optional redis package; Redis expires keys itself, so purge() has nothing to do
+class RedisStateStore(StateStore):
+    def __init__(self, url, ttl=86400, prefix="user_state:"):
+        super().__init__(ttl)
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=redis requires the redis package (pip install redis)")
+        self.prefix = prefix
+        self.client = aioredis.from_url(url)
+
+    async def get(self, chat_id):
+        raw = await self.client.get(f"{self.prefix}{chat_id}")
+        return json.loads(raw) if raw else {}
+
+    async def set(self, chat_id, state):
+        if not state:
+            await self.delete(chat_id)
+            return
+        await self.client.set(f"{self.prefix}{chat_id}", json.dumps(state), ex=self.ttl)
+
+    async def delete(self, chat_id):
+        await self.client.delete(f"{self.prefix}{chat_id}")
+
+    async def close(self):
+        await self.client.aclose()
+
+def create_state_store(backend=STATE_BACKEND, ttl=STATE_TTL):
+    if backend == "memory":
+        return MemoryStateStore(ttl)
+    if backend == "postgres":
+        return PostgresStateStore(ttl)
+    if backend == "redis":
+        return RedisStateStore(REDIS_URL, ttl)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+state_store = create_state_store()
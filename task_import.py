@@ -0,0 +1,131 @@
+import csv
+import datetime
+import io
+import json
+import math
+import os
+from dataclasses import dataclass
+
+TASK_EXPIRY_HOURS = float(os.getenv("TASK_EXPIRY_HOURS", 24))
+MAX_IMPORT_TASKS = int(os.getenv("MAX_IMPORT_TASKS", 1000))
+
+@dataclass(frozen=True)
+class TaskSpec:
+    type: str
+    link: str
+    reward: float
+    expires_at: datetime.datetime
+
+# Parses a bulk task upload. Accepted formats:
+#   lines: "<type> <link> <reward> [expiry_hours]" per line, like /add_task
+#   csv:   header with type,link,reward and optionally expires_in_hours or expires_at (ISO)
+#   json:  a list of objects with the same keys
+# Returns (tasks, errors); callers import nothing unless errors is empty.
+def parse_tasks(content, fmt, expiry_hours=TASK_EXPIRY_HOURS, now=None):
+    now = now or datetime.datetime.now()
+    if fmt == "json":
+        try:
+            records = json.loads(content)
+        except ValueError as e:
+            return [], [f"Invalid JSON: {e}"]
+        if not isinstance(records, list):
+            return [], ["JSON must be a list of task objects."]
+        rows = [(index + 1, record) for index, record in enumerate(records)]
+    elif fmt == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        missing = {"type", "link", "reward"} - set(reader.fieldnames or [])
+        if missing:
+            return [], [f"CSV header is missing: {', '.join(sorted(missing))}"]
+        rows = [(index + 2, record) for index, record in enumerate(reader)]
+    elif fmt == "lines":
+        rows = []
+        for index, line in enumerate(content.splitlines()):
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) not in (3, 4):
+                rows.append((index + 1, None))
+                continue
+            record = dict(zip(("type", "link", "reward", "expires_in_hours"), fields))
+            rows.append((index + 1, record))
+    else:
+        raise ValueError(f"Unknown task import format: {fmt}")
+
+    if len(rows) > MAX_IMPORT_TASKS:
+        return [], [f"Too many tasks ({len(rows)}); the limit is {MAX_IMPORT_TASKS} per import."]
+    tasks, errors = [], []
+    for line_no, record in rows:
+        try:
+            tasks.append(_parse_record(record, expiry_hours, now))
+        except ValueError as e:
+            errors.append(f"Line {line_no}: {e}")
+    return tasks, errors
+
+# Parses one /add_task-style argument list: [type, link, reward] or [type, link, reward, expiry_hours]
+def parse_task(fields, expiry_hours=TASK_EXPIRY_HOURS, now=None):
+    if len(fields) not in (3, 4):
+        raise ValueError("expected <type> <link> <reward> [expiry_hours]")
+    record = dict(zip(("type", "link", "reward", "expires_in_hours"), fields))
+    return _parse_record(record, expiry_hours, now or datetime.datetime.now())
+
+# Raises ValueError unless value is a finite, positive number of hours
+def parse_expiry_hours(value):
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"expiry hours must be a number, got {value!r}")
+    if not math.isfinite(hours) or hours <= 0:
+        raise ValueError(f"expiry hours must be a positive number, got {value!r}")
+    return hours
+
+def _parse_record(record, expiry_hours, now):
+    if not isinstance(record, dict):
+        raise ValueError("expected <type> <link> <reward> [expiry_hours]")
+    task_type = str(record.get("type") or "").strip()
+    link = str(record.get("link") or "").strip()
+    if not task_type or not link:
+        raise ValueError("type and link are required")
+    try:
+        reward = float(record.get("reward"))
+    except (TypeError, ValueError):
+        raise ValueError(f"reward must be a number, got {record.get('reward')!r}")
+    if not math.isfinite(reward):
+        raise ValueError(f"reward must be a finite number, got {record.get('reward')!r}")
+    if reward <= 0:
+        raise ValueError("reward must be positive")
+    if record.get("expires_at"):
+        try:
+            expires_at = datetime.datetime.fromisoformat(str(record["expires_at"]))
+        except ValueError:
+            raise ValueError(f"expires_at must be an ISO date/time, got {record['expires_at']!r}")
+        # Tasks store naive local times, so an offset is applied here rather than compared against `now`
+        if expires_at.tzinfo is not None:
+            try:
+                expires_at = expires_at.astimezone().replace(tzinfo=None)
+            except OverflowError:
+                raise ValueError(f"expires_at is out of range, got {record['expires_at']!r}")
+    else:
+        hours = parse_expiry_hours(record.get("expires_in_hours") or expiry_hours)
+        try:
+            expires_at = now + datetime.timedelta(hours=hours)
+        except OverflowError:
+            raise ValueError(f"expiry hours is too large, got {hours!r}")
+    if expires_at <= now:
+        raise ValueError("expiry must be in the future")
+    return TaskSpec(task_type, link, reward, expires_at)
+
+# "3 7 10-12" -> [3, 7, 10, 11, 12]
+def parse_task_ids(args):
+    ids = []
+    for arg in args:
+        for part in arg.split(","):
+            if not part:
+                continue
+            if "-" in part:
+                first, last = (int(value) for value in part.split("-", 1))
+                if last < first or last - first > MAX_IMPORT_TASKS:
+                    raise ValueError(f"Invalid range: {part}")
+                ids.extend(range(first, last + 1))
+            else:
+                ids.append(int(part))
+    return sorted(set(ids))
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Predefined FAQs
+FAQS = {
+    "what_is_ethereal": {
+        "question": "What is Ethereal?",
+        "answer": "Ethereal is a platform where you earn money by completing tasks like reading posts, playing games, sending Snapchat streaks, and inviting friends."
+    },
+    "payment_methods": {
+        "question": "What payment methods are available?",
+        "answer": "Payments can be made via bank transfer, mobile money, or Zelle, depending on your country. Check the 'How to Pay' guide in the Help menu."
+    },
+    "task_rewards": {
+        "question": "How are task rewards calculated?",
+        "answer": "Rewards vary by task type. For example, reading posts earns $2.5 per 10 words, Candy Crush tasks earn $5 daily, and Snapchat streaks can earn up to $20."
+    }
+}
+
+HELP_TOPICS = {
+    "how_to_pay": {"label": "How to Pay", "type": "video", "url": "https://youtu.be/YourPaymentGuide"},
+    "register": {"label": "Registration Process", "type": "text", "text": (
+        "1. Once you have clicked start → choose package\n"
+        "2. Select your coach\n"
+        "3. Pay via your selected country account → upload screenshot\n"
+        "4. Wait for approval, then send details\n"
+        "5. Join the group and start earning! 🎉"
+    )},
+    "daily_tasks": {"label": "Daily Tasks", "type": "video", "url": "https://youtu.be/YourTasksGuide"},
+    "reminder": {"label": "Toggle Reminder", "type": "toggle"},
+    "faq": {"label": "FAQs", "type": "faq"},
+    "password_recovery": {"label": "Password Recovery", "type": "input", "text": "Please provide your registered email to request password recovery:"},
+    "apply_coach": {"label": "Apply to be a Coach", "type": "text", "text": "To apply to be a coach, use the /coach command. An admin will contact you."},
+}
+
+HOW_IT_WORKS_TEXT = (
+    "🔖 How Ethereal💚 Works\n"
+    "Ethereal rewards you for everyday activities — like reading posts, playing games (e.g., Candy Crush), "
+    "sending Snapchat streaks, and clicking links.\n"
+    "— — —\n"
+    "📍 ETHEREAL STANDARD — ₦9,000\n"
+    "• Instant ₦8,000 cashback\n"
+    "• Free up to 3GB data on signup\n"
+    "• Earn up to $1 per link\n"
+    "• Earn up to ₦2,500 for every 10 words read\n"
+    "• Up to ₦5,000 daily from Candy Crush\n"
+    "• Daily passive income from your team + your earnings (₦5,000 daily)\n"
+    "• Earn up to $20 sending Snapchat streaks\n"
+    "• ₦8,100–₦8,400 per person you invite\n"
+    "• Valid for 5 months (renewal fee required)\n"
+    "• No personal AI-assisted earnings\n\n"
+    "— — —\n\n"
+    "📍 ETHEREAL-X — ₦14,000\n"
+    "• Instant ₦12,000 cashback\n"
+    "• Free up to 5GB data on signup\n"
+    "• Earn up to $2 per link\n"
+    "• Earn up to ₦3,500 per 10 words (no cap)\n"
+    "• Up to ₦5,000 daily from Candy Crush\n"
+    "• Earn up to $50 sending Snapchat streaks\n"
+    "• Daily passive income from your team + your earnings (₦10,000 daily)\n"
+    "• ₦12,500–₦13,000 per person you invite\n"
+    "• Valid for 1 year (no renewal fee)\n"
+    "• Includes personal AI-assisted earnings"
+)
+
+@dataclass(frozen=True)
+class Template:
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+def _button(label, callback_data):
+    return InlineKeyboardButton(label, callback_data=callback_data)
+
+# Static messages and keyboards, built once at import. PTB freezes InlineKeyboardMarkup after
+# construction, so one instance can be shared by every render.
+class TemplateRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def add(self, name, text, rows=None):
+        if name in self._templates:
+            raise ValueError(f"Template already registered: {name}")
+        reply_markup = InlineKeyboardMarkup(rows) if rows is not None else None
+        self._templates[name] = Template(text, reply_markup)
+
+    def __getitem__(self, name):
+        return self._templates[name]
+
+    def get(self, name):
+        return self._templates.get(name)
+
+    def __contains__(self, name):
+        return name in self._templates
+
+    def __len__(self):
+        return len(self._templates)
+
+def build_templates():
+    registry = TemplateRegistry()
+    back_to_help = [_button("🔙 Help Menu", "help")]
+
+    guest_menu = [
+        [_button("How It Works", "how_it_works")],
+        [_button("Purchase Coupon", "coupon")],
+        [_button("💸 Register & Make Payment", "package_selector")],
+        [_button("❓ Help", "help")],
+    ]
+    registered_menu = [
+        [_button("📊 My Stats", "stats")],
+        [_button("Do Daily Tasks", "daily_tasks")],
+        [_button("💰 Earn Extra for the Day", "earn_extra")],
+        [_button("Purchase Coupon", "coupon")],
+        [_button("❓ Help", "help")],
+    ]
+    x_menu = registered_menu[:1] + [[_button("🚀 Boost with AI", "boost_ai")]] + registered_menu[1:]
+    registry.add("main_menu_guest", "Select an option below:", guest_menu)
+    registry.add("main_menu_registered", "Select an option below:", registered_menu)
+    registry.add("main_menu_x", "Select an option below:", x_menu)
+
+    help_rows = [[_button(topic["label"], key)] for key, topic in HELP_TOPICS.items()]
+    registry.add("help_menu_guest", "What would you like help with?", help_rows + [[_button("🔙 Main Menu", "menu")]])
+    registry.add(
+        "help_menu_registered",
+        "What would you like help with?",
+        help_rows + [[_button("👥 Refer a Friend", "refer_friend")], [_button("🔙 Main Menu", "menu")]]
+    )
+    for key, topic in HELP_TOPICS.items():
+        if topic["type"] in ("text", "input"):
+            registry.add(f"help_{key}", topic["text"], [back_to_help])
+        elif topic["type"] == "video":
+            registry.add(f"help_{key}", f"Watch here: {topic['url']}", [back_to_help])
+        elif topic["type"] == "toggle":
+            registry.add(f"help_{key}", "Toggle your daily reminder:", [[_button("Toggle Reminder On/Off", "toggle_reminder")], back_to_help])
+
+    faq_rows = [[_button(faq["question"], f"faq_{key}")] for key, faq in FAQS.items()]
+    faq_rows += [[_button("Ask Another Question", "faq_custom")], back_to_help]
+    registry.add("faq_menu", "Select a question or ask your own:", faq_rows)
+    for key, faq in FAQS.items():
+        registry.add(
+            f"faq_{key}",
+            f"❓ {faq['question']}\n\n{faq['answer']}",
+            [[_button("🔙 అవసరం లేదు FAQ Menu", "faq"), _button("🔙 Help Menu", "help")]]
+        )
+    registry.add("faq_custom", "Please type your question:", [back_to_help])
+    registry.add("faq_not_found", "FAQ not found.", [back_to_help])
+
+    registry.add("how_it_works", HOW_IT_WORKS_TEXT, [[_button("💎Get Started", "package_selector")], [_button("🔙 Main Menu", "menu")]])
+    return registry
+
+templates = build_templates()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", 64))
+
+logger = logging.getLogger(__name__)
+
+# Processes updates from different chats in parallel while keeping each chat's updates in arrival order
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=64):
+        super().__init__(max_concurrent_updates)
+        # chat_id -> [lock, number of updates holding or waiting for it]
+        self._locks = {}
+        self.processed = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+
+    @staticmethod
+    def chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return update.effective_user.id
+        return None
+
+    # Overrides the base class so a chat's queued updates wait on their chat lock *before* taking one
+    # of the max_concurrent_updates slots; otherwise one busy chat could fill every slot while idle
+    async def process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which preserves per-chat update order
+            async with entry[0]:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            await coroutine
+        finally:
+            self._in_flight -= 1
+            self.processed += 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._locks:
+            logger.warning(f"Update processor shut down with {len(self._locks)} chats still busy")
+
+    def stats(self):
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "busy_chats": len(self._locks),
+            "processed": self.processed,
+        }
+
+update_processor = ChatOrderedUpdateProcessor(max_concurrent_updates=MAX_CONCURRENT_UPDATES)
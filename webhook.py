@@ -0,0 +1,120 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+import db
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public base URL, e.g. https://bot.example.com; empty skips setWebhook
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", 8080)))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+logger = logging.getLogger(__name__)
+
+# Receives updates pushed by Telegram and hands them to the application's update queue
+class WebhookServer:
+    def __init__(self, application, path="/webhook", secret=""):
+        self.application = application
+        self.path = path
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get("/healthz", self.health)
+
+    async def handle_update(self, request):
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.rejected += 1
+            return web.Response(status=400, text="invalid JSON")
+        try:
+            update = Update.de_json(data, self.application.bot) if isinstance(data, dict) else None
+        except (TypeError, KeyError, ValueError, AttributeError) as e:
+            # A JSON object that is not an Update fails inside PTB's constructors; reject it rather than 500
+            logger.warning(f"Rejected malformed update from {request.remote}: {e}")
+            update = None
+        if update is None:
+            self.rejected += 1
+            return web.Response(status=400, text="invalid update")
+        self.received += 1
+        # Acknowledge immediately; handlers run from the queue so Telegram never waits on them
+        await self.application.update_queue.put(update)
+        return web.Response(text="ok")
+
+    async def health(self, request):
+        running = self.application.running and db.pool is not None
+        body = {
+            "status": "ok" if running else "starting",
+            "received": self.received,
+            "rejected": self.rejected,
+            "update_queue": self.application.update_queue.qsize(),
+        }
+        if db.pool is not None:
+            stats = db.pool.get_stats()
+            body["db_pool"] = {
+                "size": stats.get("pool_size", 0),
+                "available": stats.get("pool_available", 0),
+                "waiting": stats.get("requests_waiting", 0),
+            }
+        return web.json_response(body, status=200 if running else 503)
+
+async def serve(application, url=WEBHOOK_URL, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                host=WEBHOOK_HOST, port=WEBHOOK_PORT, max_connections=WEBHOOK_MAX_CONNECTIONS):
+    if url and not secret:
+        logger.warning("WEBHOOK_SECRET is not set; anyone who knows the webhook URL can post updates")
+    server = WebhookServer(application, path=path, secret=secret)
+    runner = web.AppRunner(server.app)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    # Same lifecycle as Application.run_polling: initialize -> post_init -> start, and the reverse on exit
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        if url:
+            await application.bot.set_webhook(
+                url.rstrip("/") + path,
+                secret_token=secret or None,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=max_connections,
+            )
+            logger.info(f"Webhook set to {url.rstrip('/')}{path}")
+        else:
+            logger.info("WEBHOOK_URL not set; serving without registering a webhook with Telegram")
+        logger.info(f"Listening for updates on {host}:{port}{path}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run_webhook(application):
+    asyncio.run(serve(application))